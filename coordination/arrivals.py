@@ -0,0 +1,156 @@
+""" 
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the arrival traces, recorded by 
+UDPFlows for each packet they receive. Statistics are computed over the whole 
+trace (or over the packets retained) with NumPy when it is available, and in 
+pure Python otherwise.
+"""
+
+from array import array
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+###############################################################################
+class ArrivalTrace:
+
+   """
+   ArrivalTrace records the sequence number, arrival time (ns, relative to the 
+   first arrival) and size (bytes) of the packets of a flow, in compact arrays. 
+   Rates are expressed in kbps and sizes in kb, as in the rest of the tool.
+
+   For long streams, the number of packets retained can be bounded: only the 
+   last 'retention' packets (at least) are kept, the oldest ones being dropped 
+   by blocks so that the arrays stay contiguous. The totals of the stream are 
+   kept apart, hence its mean rate remains exact, while the envelope and the 
+   arrival curve are computed over the packets retained.
+   """
+
+   def __init__(self, retention = None):
+      self.seq = array('l')
+      self.arrival = array('l')
+      self.size = array('l')
+      self.t_init = None
+      self.retention = retention
+
+      # Totals of the stream, including the packets dropped.
+      self.packets = 0
+      self.bytes = 0
+
+   def __len__(self):
+      return len(self.seq)
+
+   def add(self, seq, t, size):
+      if self.t_init is None:
+         self.t_init = t
+      self.seq.append(seq)
+      self.arrival.append(int((t - self.t_init)*1e9))
+      self.size.append(size)
+      self.packets += 1
+      self.bytes += size
+
+      # The oldest packets are dropped once twice the retention is reached.
+      if self.retention is not None and len(self) >= 2*self.retention:
+         self.trim()
+
+   # Drops the oldest packets, keeping the last 'retention' ones.
+   def trim(self):
+      n = len(self) - self.retention
+      if n > 0:
+         del self.seq[:n]
+         del self.arrival[:n]
+         del self.size[:n]
+
+   # Appends the packets of another trace of the same flow, keeping the 
+   # arrival order.
+   def merge(self, trace):
+      if not len(trace):
+         return
+      if not len(self):
+         self.__dict__.update(trace.__dict__)
+         return
+      self.packets += trace.packets
+      self.bytes += trace.bytes
+      offset = int((trace.t_init - self.t_init)*1e9)
+      packets = zip(self.arrival, self.seq, self.size) + \
+                [(a + offset, s, b) for a, s, b in zip(trace.arrival, trace.seq, trace.size)]
+      packets.sort()
+      if packets[0][0] < 0:
+         self.t_init += packets[0][0]*1e-9
+         packets = [(a - packets[0][0], s, b) for a, s, b in packets]
+      self.arrival = array('l', [p[0] for p in packets])
+      self.seq = array('l', [p[1] for p in packets])
+      self.size = array('l', [p[2] for p in packets])
+      if self.retention is not None:
+         self.trim()
+
+   # Returns the arrival times (s) and the cumulated sizes (kb) of the packets, 
+   # as NumPy arrays (or lists without NumPy).
+   def curve(self):
+      if numpy is not None:
+         t = numpy.frombuffer(self.arrival, dtype = numpy.int_) * 1e-9
+         A = numpy.cumsum(numpy.frombuffer(self.size, dtype = numpy.int_)) / 125.
+         return t, A
+      t = [a*1e-9 for a in self.arrival]
+      A = []
+      s = 0
+      for b in self.size:
+         s += b
+         A.append(s/125.)
+      return t, A
+
+   # Returns the mean rate (kbps) between the first and the last arrivals of 
+   # the stream.
+   def rate(self):
+      if self.packets < 2 or self.arrival[-1] == 0:
+         return 0
+      return self.bytes / (125. * self.arrival[-1] * 1e-9)
+
+   # Returns the smallest sigma (kb) such that the trace conforms to the token 
+   # bucket (rho, sigma), that is, b(i..j) <= rho*(t_j - t_i) + sigma for all 
+   # the packets i <= j.
+   def envelope(self, rho):
+      if not len(self):
+         return 0
+      t, A = self.curve()
+      if numpy is not None:
+         sizes = numpy.frombuffer(self.size, dtype = numpy.int_) / 125.
+         # b(i..j) - rho*(t_j - t_i) = (A_j - rho t_j) - (A_i - b_i - rho t_i)
+         D = A - rho*t
+         E = numpy.minimum.accumulate(D - sizes)
+         return float(numpy.max(D - E))
+      sigma = 0
+      E = None
+      for i in range(len(self)):
+         D = A[i] - rho*t[i]
+         E = D - self.size[i]/125. if E is None else min(E, D - self.size[i]/125.)
+         sigma = max(sigma, D - E)
+      return sigma
+
+   # Returns the maximum amount of data (kb) received within any interval of 
+   # length tau (s), for each tau of the list: the empirical arrival curve.
+   def arrival_curve(self, taus):
+      t, A = self.curve()
+      if not len(self):
+         return [0 for tau in taus]
+      if numpy is not None:
+         B = numpy.concatenate(([0], A))
+         curve = []
+         for tau in taus:
+            j = numpy.searchsorted(t, t + tau, side = 'right')
+            curve.append(float(numpy.max(B[j] - B[:-1])))
+         return curve
+      curve = []
+      for tau in taus:
+         best = 0
+         j = 0
+         for i in range(len(self)):
+            while j < len(self) and t[j] <= t[i] + tau:
+               j += 1
+            best = max(best, A[j - 1] - (A[i - 1] if i else 0))
+         curve.append(best)
+      return curve
\ No newline at end of file
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file is a benchmark of the UDP client of the coordination tool, streaming
+a video on the loopback interface: the cost of sending its frames, with and
+without packet templates, and the bursts of packets received, with and
+without spreading the packets of each frame.
+"""
+
+import sys
+import socket
+from threading import Thread
+from udpmodule import *
+from pacer import Pacer, monotonic
+from schedule import Schedule
+from frametrace import *
+
+addr = '127.0.0.1'
+fps = 30
+dt = 1./fps
+window = 0.001 # Window in which the bursts are counted (s).
+
+# Returns the sizes (kb) of the VBR frames of a video, given as text or as a
+# frame trace.
+def parse_frames(path):
+   if FrameTrace.isTrace(path):
+      trace = FrameTrace(path)
+      schedule = Schedule.fromTrace(trace)
+      trace.close()
+      return list(schedule.vbr)
+   return [size/125. for t, size in parse_video(path)[0]]
+
+# Sends the frames back to back, and returns the time per frame and per packet.
+def bench_cost(frames, templates, rounds):
+   client = UDPClient(addr, 0, 0, templates)
+   t = monotonic()
+   for i in range(rounds):
+      for size in frames:
+         client.send(size)
+   t = monotonic() - t
+   n = client.timestamp
+   client.close()
+   return t/(rounds*len(frames)), t/n
+
+# Receives the datagrams until none comes for a while, recording their 
+# arrival.
+def receive(s, arrivals):
+   s.settimeout(0.5)
+   try:
+      while True:
+         s.recv(UDPPacket.tot_size)
+         arrivals.append(monotonic())
+   except socket.timeout:
+      pass
+
+# Streams the frames at fps, their packets spread over spread*dt seconds, and
+# returns the number of packets received, the largest number received within
+# window seconds, and the mean and max time to send a frame.
+def bench_bursts(frames, spread):
+   s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+   s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+   s.bind((addr, UDPServer.port))
+   arrivals = []
+   receiver = Thread(target = receive, args = (s, arrivals))
+   receiver.daemon = True
+   receiver.start()
+
+   client = UDPClient(addr, 0, spread*dt)
+   pacer = Pacer(dt)
+   busy = []
+   for size in frames:
+      pacer.wait()
+      t = monotonic()
+      client.send(size)
+      busy.append(monotonic() - t)
+   client.close()
+
+   receiver.join()
+   s.close()
+
+   burst = 0
+   j = 0
+   for i in range(len(arrivals)):
+      while arrivals[i] - arrivals[j] > window:
+         j += 1
+      burst = max(burst, i - j + 1)
+   return len(arrivals), burst, sum(busy)/len(busy), max(busy)
+
+if len(sys.argv) in (2, 3, 4):
+   try:
+      frames = parse_frames(sys.argv[1])
+   except (IOError, ValueError), msg:
+      print 'Cannot open', sys.argv[1], msg
+      sys.exit(0)
+   n = int(sys.argv[2]) if len(sys.argv) > 2 else 2*fps
+   spread = float(sys.argv[3]) if len(sys.argv) > 3 else 0.8
+   print len(frames), 'frames,', sum(frames)/len(frames)*fps, 'kbps'
+
+   for templates in (False, True):
+      frame, packet = bench_cost(frames, templates, 10)
+      print '%-10s: %.3f ms per frame, %.3f us per packet' % \
+            ('templates' if templates else 'strings', 1000*frame, 1e6*packet)
+
+   for s in (0, spread):
+      received, burst, mean, worst = bench_bursts(frames[:n], s)
+      print 'spread %.2f: %d packets, at most %d within %.0f ms,' % \
+            (s, received, burst, 1000*window),
+      print 'send time: mean %.3f ms, max %.3f ms' % (1000*mean, 1000*worst)
+
+else:
+   print 'Wrong usage'
+   print 'python bench.py video [frames] [spread]'
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the on-disk cache of the schedules
+of the videos, so that the frames of a video replayed by many runs are parsed
+only once.
+"""
+
+import os
+import errno
+import hashlib
+import tempfile
+from schedule import Schedule
+
+###############################################################################
+class ScheduleCache:
+
+   """
+   ScheduleCache stores the schedules (see Schedule.write) in a directory,
+   keyed by the SHA-1 hash of the content of the files they were parsed from
+   (a video can be made of several streams) and by the version of their 
+   format: a file renamed, copied to another host
+   or shared between runs hits the same entry, and a file modified misses it.
+   The cache is bounded in size: the least recently used entries (by
+   modification time, updated on every hit) are removed once it is exceeded.
+   Any error of the cache only makes it miss, the file being parsed again.
+   """
+
+   directory = os.environ.get('H264_CACHE',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'h264'))
+   capacity = 256 << 20 # Bytes.
+   chunk = 1 << 20 # Bytes read at once when hashing.
+   suffix = '.sch'
+
+   def __init__(self, directory = None, capacity = None):
+      self.directory = directory or ScheduleCache.directory
+      self.capacity = capacity or ScheduleCache.capacity
+
+   # Returns the key of the files at paths, in their order. The size of each 
+   # file is hashed after its content, so that files are not mixed up.
+   def key(self, *paths):
+      h = hashlib.sha1()
+      for path in paths:
+         file = open(path, 'rb')
+         size = 0
+         try:
+            data = file.read(ScheduleCache.chunk)
+            while data:
+               h.update(data)
+               size += len(data)
+               data = file.read(ScheduleCache.chunk)
+         finally:
+            file.close()
+         h.update('\0%d\0' % size)
+      return '%s-v%d' % (h.hexdigest(), Schedule.version)
+
+   def entry(self, key):
+      return os.path.join(self.directory, key + ScheduleCache.suffix)
+
+   # Returns the schedule cached under key, None if there is none.
+   def get(self, key):
+      path = self.entry(key)
+      try:
+         file = open(path, 'rb')
+      except IOError:
+         return None
+      try:
+         try:
+            schedule = Schedule.read(file)
+         finally:
+            file.close()
+         os.utime(path, None)
+      except (IOError, OSError, ValueError), msg:
+         print 'Ignoring cached schedule', path, msg
+         return None
+      return schedule
+
+   # Caches the schedule under key. The entry is written in a temporary file
+   # and renamed, so that concurrent runs never read a partial entry.
+   def put(self, key, schedule):
+      try:
+         try:
+            os.makedirs(self.directory)
+         except OSError, msg:
+            if msg.errno != errno.EEXIST:
+               raise
+         fd, tmp = tempfile.mkstemp(ScheduleCache.suffix + '.tmp', '', self.directory)
+         file = os.fdopen(fd, 'wb')
+         try:
+            schedule.write(file)
+         finally:
+            file.close()
+         os.rename(tmp, self.entry(key))
+         self.evict()
+      except (IOError, OSError), msg:
+         print 'Cannot cache schedule:', msg
+
+   # Removes the least recently used entries until the cache fits in its
+   # capacity.
+   def evict(self):
+      entries = []
+      total = 0
+      for name in os.listdir(self.directory):
+         if not name.endswith(ScheduleCache.suffix):
+            continue
+         path = os.path.join(self.directory, name)
+         try:
+            st = os.stat(path)
+         except OSError:
+            continue # Removed by another run.
+         entries.append((st.st_mtime, st.st_size, path))
+         total += st.st_size
+
+      entries.sort()
+      for mtime, size, path in entries:
+         if total <= self.capacity:
+            break
+         try:
+            os.remove(path)
+         except OSError:
+            pass
+         total -= size
+
+   # Returns the schedule of the files at paths, from the cache if possible, 
+   # and otherwise from loader(*paths), which is then cached unless it is 
+   # None.
+   def load(self, loader, *paths):
+      try:
+         key = self.key(*paths)
+      except IOError:
+         return loader(*paths)
+
+      schedule = self.get(key)
+      if schedule is None:
+         schedule = loader(*paths)
+         if schedule is not None:
+            self.put(key, schedule)
+      return schedule
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the binary frame traces: the NAL
+units of one or several encodings of a video, stored in fixed-width records.
+Traces are memory-mapped, and exposed as NumPy arrays when it is available.
+Text outputs of h264 and videos of the coordination tool can be converted.
+"""
+
+import mmap
+import struct
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+###############################################################################
+class FrameTrace:
+
+   """
+   FrameTrace is a binary trace of the NAL units of a video, in one or several
+   tracks (e.g. the VBR and CBR encodings). The file starts with a header
+   (magic, version, size of the records, number of tracks, number of records
+   per track), followed by the records of each track. A record holds the index
+   of the NAL unit, its type, the index of its GOP and its size in bytes. All
+   values are little-endian.
+   """
+
+   magic = 'H264TRC\0'
+   version = 1
+   header = struct.Struct('<8sHHII')
+   record = struct.Struct('<IB3xII') # Index, type, GOP, size (bytes).
+
+   if numpy is not None:
+      dtype = numpy.dtype([('index', '<u4'), ('type', 'u1'), ('pad', 'V3'),
+                           ('gop', '<u4'), ('size', '<u4')])
+
+   def __init__(self, path):
+      self.file = open(path, 'rb')
+      self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+      magic, version, size, self.tracks, self.count = \
+         FrameTrace.header.unpack_from(self.map, 0)
+      if magic != FrameTrace.magic or size != FrameTrace.record.size:
+         raise ValueError('%s is not a frame trace' % path)
+      if version != FrameTrace.version:
+         raise ValueError('Unknown frame trace version: %d' % version)
+
+   def close(self):
+      self.map.close()
+      self.file.close()
+
+   def __len__(self):
+      return self.count
+
+   # Returns True if the file at path is a frame trace.
+   @staticmethod
+   def isTrace(path):
+      with open(path, 'rb') as f:
+         return f.read(len(FrameTrace.magic)) == FrameTrace.magic
+
+   # Returns the records of a track, as a NumPy structured array mapped on the
+   # file (fields index, type, gop and size), or as a list of tuples (index,
+   # type, gop, size) without NumPy.
+   def track(self, k):
+      offset = FrameTrace.header.size + k*self.count*FrameTrace.record.size
+      if numpy is not None:
+         return numpy.frombuffer(self.map, FrameTrace.dtype, self.count, offset)
+      return [FrameTrace.record.unpack_from(self.map, offset + i*FrameTrace.record.size)
+              for i in range(self.count)]
+
+   # Writes a trace made of the given tracks: lists of pairs (type, size in
+   # bytes) of the same length. Indices and GOPs are numbered from 0.
+   @staticmethod
+   def write(path, tracks):
+      count = len(tracks[0]) if tracks else 0
+      with open(path, 'wb') as f:
+         f.write(FrameTrace.header.pack(FrameTrace.magic, FrameTrace.version,
+                                        FrameTrace.record.size, len(tracks), count))
+         for track in tracks:
+            if len(track) != count:
+               raise ValueError('Tracks of a frame trace must have the same length')
+            gop = 0
+            idr = False
+            data = []
+            for i, (type, size) in enumerate(track):
+               # A GOP starts at each IDR frame (but the first one).
+               if type == 5:
+                  if idr:
+                     gop += 1
+                  idr = True
+               data.append(FrameTrace.record.pack(i, type, gop, size))
+            f.write(''.join(data))
+
+# Parses a text output of h264: the list of pairs (type, size in bytes) of the
+# NAL units. Only the VCL units (types 1 and 5) are kept if vcl.
+def parse_nal(path, vcl = False):
+   units = []
+   with open(path, 'r') as f:
+      for line in f:
+         fields = line.split(',')
+         if len(fields) < 3:
+            continue
+         type = int(fields[1])
+         if vcl and type not in (1, 5):
+            continue
+         units.append((type, int(round(float(fields[2])*125))))
+   return units
+
+# Parses a video of the coordination tool (lines 'type size type size', sizes
+# in kb, for the VBR and CBR encodings): returns the two tracks.
+def parse_video(path):
+   vbr = []
+   cbr = []
+   with open(path, 'r') as f:
+      for line in f:
+         fields = line.split()
+         if not fields:
+            continue
+         vbr.append((int(fields[0]), int(round(float(fields[1])*125))))
+         cbr.append((int(fields[2]), int(round(float(fields[3])*125))))
+   return [vbr, cbr]
+
+# Returns True if the text file at path is an output of h264.
+def isNAL(path):
+   with open(path, 'r') as f:
+      for line in f:
+         if line.strip():
+            return ',' in line
+   return False
\ No newline at end of file
@@ -1,61 +1,152 @@
-""" 
-Author: Cedric Bonhomme
-Date: 26-07-2015
-
-This file contains the implementation of the Listener class, whose job is to 
-listen to senders (sender.py) streaming UDP content and reply resulting 
-statistics.
-"""
-
-import Queue
-from tcpmodule import *
-from udpmodule import *
-
-class Listener:
-
-   """
-   Listener is a class containing two threads, respectively handling incoming 
-   TCP and UDP requests. The main method run() handles the communication 
-   between those threads.
-   """
-   
-   expiration = 5
-   
-   def __init__(self, dest):
-      self.ON = True
-      self.tcp_queue = Queue.Queue()
-      self.tcpServer = TCPServer(dest, self.tcp_queue)
-      self.udpServer = UDPServer(dest)
-      self.tcpServer.start()
-      self.udpServer.start()
-      
-      # The listener is up if its servers are up too.
-      self.ON = self.udpServer.isAlive() and self.tcpServer.isAlive()
-      
-   def close(self):
-      self.ON = False
-      self.tcpServer.close()
-      self.udpServer.close()
-      self.tcpServer.join()
-      self.udpServer.join()
-
-   def isAlive(self):
-      return self.ON
-      
-   def run(self):
-      while self.isAlive():
-         try:
-            payload, src = self.tcp_queue.get(True, Listener.expiration)
-
-            # Sender at address 'src' starts a UDP measure.
-            if payload[0] == 'init_stream':
-               self.udpServer.addFlow(src)
-               
-            # Sender at address 'src' closes its UDP measure.
-            # The listener replies with the rho and sigma measure.
-            elif payload[0] == 'close_stream':
-               self.ON = TCPClient.send(src, 'close_ack', self.udpServer.delFlow(src))
-
-         # Checking periodically if both TCP and UDP servers are still alive.
-         except Queue.Empty: 
-             self.ON = self.tcpServer.isAlive() and self.udpServer.isAlive()
\ No newline at end of file
+""" 
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the Listener class, whose job is to 
+listen to senders (sender.py) streaming UDP content and reply resulting 
+statistics.
+"""
+
+import time
+import Queue
+from tcpmodule import *
+from udpmodule import *
+from reactor import Reactor
+
+class Listener:
+
+   """
+   Listener is a class containing two threads, respectively handling incoming 
+   TCP and UDP requests. The main method run() handles the communication 
+   between those threads. If evented, both servers are run by a single 
+   reactor instead, and the messages are handled as soon as they come in.
+   During a stream, the listener reports the statistics of the last interval 
+   to its sender, if asked to.
+   """
+   
+   expiration = 5
+   tick = 0.1 # Period at which due reports are looked for (evented).
+   
+   def __init__(self, dest, evented = False):
+      self.ON = True
+      self.reactor = Reactor() if evented else None
+      self.outbox = TCPOutbox() if evented else None
+      self.udpServer = UDPServer(dest)
+
+      # Reports asked by senders: (period, time of the next report), by flow.
+      self.reports = {}
+
+      # The TCP server hands the messages to the listener itself if evented.
+      if evented:
+         self.tcpServer = TCPServer(dest, self)
+         for server in (self.tcpServer, self.udpServer):
+            if server.isAlive():
+               server.attach(self.reactor)
+      else:
+         self.tcp_queue = Queue.Queue()
+         self.tcpServer = TCPServer(dest, self.tcp_queue)
+         self.tcpServer.start()
+         self.udpServer.start()
+      
+      # The listener is up if its servers are up too.
+      self.ON = self.udpServer.isAlive() and self.tcpServer.isAlive()
+      
+   def close(self):
+      self.ON = False
+      self.tcpServer.close()
+      self.udpServer.close()
+      if self.reactor is None:
+         self.tcpServer.join()
+         self.udpServer.join()
+      else:
+         self.reactor.close()
+         self.outbox.close()
+      TCPClient.close()
+
+   def isAlive(self):
+      return self.ON
+
+   # Checks if both TCP and UDP servers are still alive.
+   def check(self):
+      self.ON = self.tcpServer.isAlive() and self.udpServer.isAlive()
+      if not self.ON and self.reactor is not None:
+         self.reactor.stop()
+
+   # Called by the TCP server for each message, if evented.
+   def put(self, message):
+      self.handle(*message)
+      if not self.ON:
+         self.reactor.stop()
+
+   def handle(self, payload, src):
+      # Older senders may send no attributes.
+      attrs = payload[1] or []
+
+      # Sender at address 'src' starts a UDP measure, identified by 
+      # a flow identifier (0 by default).
+      # The sender can also ask for a report every period seconds, and tell 
+      # whether the stream carries NAL units.
+      if payload[0] == 'init_stream':
+         flow = attrs[0] if attrs else 0
+         nal = len(attrs) > 2 and attrs[2]
+         self.udpServer.addFlow(src, flow, nal)
+         if len(attrs) > 1 and attrs[1] > 0:
+            self.reports[(src, flow)] = [attrs[1], time.time() + attrs[1]]
+         
+      # Sender at address 'src' closes its UDP measure.
+      # The listener replies with the rho and sigma measure.
+      elif payload[0] == 'close_stream':
+         flow = attrs[0] if attrs else 0
+         self.reports.pop((src, flow), None)
+         self.ON = self.reply(src, 'close_ack', self.udpServer.delFlow(src, flow))
+
+   # Replies to a sender. If evented, the reply is posted to the outbox, so 
+   # that an unreachable sender never blocks the reactor.
+   def reply(self, dest, payload_type, attr = None):
+      if self.outbox is not None:
+         self.outbox.post(dest, payload_type, attr, Listener.expiration)
+         return True
+      return TCPClient.send(dest, payload_type, attr)
+
+   # Sends the reports that are due. Returns the time until the next one, 
+   # None if no report is asked.
+   def report(self):
+      t = time.time()
+      for key, r in self.reports.items():
+         if r[1] > t:
+            continue
+         f = self.udpServer.find(*key)
+         if f is not None and not self.reply(key[0], 'report', f.report(t)):
+            self.reports.pop(key)
+            continue
+         # Reports missed (e.g. while handling a message) are skipped.
+         while r[1] <= t:
+            r[1] += r[0]
+
+      if not self.reports:
+         return None
+      return max(0, min(r[1] for r in self.reports.values()) - t)
+      
+   def run(self):
+      # The servers stop the reactor on error. They are still checked 
+      # periodically, as in the threaded mode.
+      if self.reactor is not None:
+         timers = [self.reactor.every(Listener.tick, self.report), 
+                   self.reactor.every(Listener.expiration, self.check)]
+         self.reactor.run()
+         for timer in timers:
+            timer.cancel()
+         return
+
+      while self.isAlive():
+         try:
+            # Messages are waited for until the next report is due.
+            timeout = self.report()
+            if timeout is None or timeout > Listener.expiration:
+               timeout = Listener.expiration
+            payload, src = self.tcp_queue.get(True, timeout)
+            self.handle(payload, src)
+
+         # Checking periodically if both TCP and UDP servers are still alive.
+         except Queue.Empty: 
+             self.check()
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the NAL unit index of raw H.264
+streams, used to build the videos of the coordination tool directly from the
+'.h264' files. The streams are memory-mapped, and their start codes are found
+with NumPy when it is available, and with mmap.find otherwise.
+"""
+
+import mmap
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+###############################################################################
+class NALIndex:
+
+   """
+   NALIndex lists the NAL units of a raw H.264 stream (byte stream format):
+   their offset, size (bytes) and type (first byte & 0x1F). A unit starts
+   after a start code prefix (0x000001) and ends at the next one, without the
+   trailing zero bytes (zero_byte of 4-byte start codes). Sizes are the same
+   as those of the h264 parser, except for the last unit of the stream, which
+   the parser counts 2 bytes short.
+   """
+
+   prefix = '\x00\x00\x01'
+   VCL = (1, 5) # Types of the units that are frames (non-IDR, IDR).
+
+   def __init__(self, path):
+      self.file = open(path, 'rb')
+      self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+      if numpy is not None:
+         self.start, self.size, self.type = self.scan()
+      else:
+         self.start, self.size, self.type = self.find()
+
+   def close(self):
+      self.map.close()
+      self.file.close()
+
+   def __len__(self):
+      return len(self.start)
+
+   # Finds the units with NumPy: the start codes are searched for in the
+   # whole stream at once. Returns arrays.
+   def scan(self):
+      d = numpy.frombuffer(self.map, numpy.uint8)
+      p = numpy.flatnonzero((d[:-2] == 0) & (d[1:-1] == 0) & (d[2:] == 1))
+      start = p + 3
+      end = numpy.append(p[1:], len(d))
+
+      # Trailing zero bytes are removed, one at a time for all the units.
+      while True:
+         z = (end > start) & (d[numpy.maximum(end - 1, 0)] == 0)
+         if not z.any():
+            break
+         end -= z
+
+      keep = end > start
+      start = start[keep]
+      size = end[keep] - start
+      return start, size, d[start] & 0x1F
+
+   # Finds the units with mmap.find. Returns lists.
+   def find(self):
+      p = []
+      i = self.map.find(NALIndex.prefix)
+      while i != -1:
+         p.append(i)
+         i = self.map.find(NALIndex.prefix, i + 3)
+      p.append(len(self.map))
+
+      start = []
+      size = []
+      type = []
+      for k in range(len(p) - 1):
+         s = p[k] + 3
+         e = p[k + 1]
+         while e > s and self.map[e - 1] == '\x00':
+            e -= 1
+         if e > s:
+            start.append(s)
+            size.append(e - s)
+            type.append(ord(self.map[s]) & 0x1F)
+      return start, size, type
+
+   # Returns the list of pairs (type, size in bytes) of the units, or of the
+   # VCL units only if vcl.
+   def units(self, vcl = False):
+      units = zip([int(t) for t in self.type], [int(s) for s in self.size])
+      if vcl:
+         units = [u for u in units if u[0] in NALIndex.VCL]
+      return units
+
+# Returns the VBR and CBR tracks of a video, made of the VCL units of both raw
+# streams (as coord_stat.m does). The frames are paired in order, hence the
+# longest stream is truncated.
+def index_video(vbr, cbr):
+   tracks = []
+   for path in (vbr, cbr):
+      index = NALIndex(path)
+      tracks.append(index.units(True))
+      index.close()
+   n = min(len(tracks[0]), len(tracks[1]))
+   return [tracks[0][:n], tracks[1][:n]]
+
+###############################################################################
+class NALVideo:
+
+   """
+   NALVideo gives the NAL units of both encodings of a video, from their raw 
+   streams, to be sent for real. The frames are the VCL units, paired in 
+   order as in index_video. The units of a frame are its VCL unit and the 
+   non-VCL units (parameter sets, SEI...) preceding it in the stream, so that 
+   the frames are decodable when sent. Units are given as (offset, size) in 
+   the memory-mapped streams, which are never copied.
+   """
+
+   def __init__(self, vbr, cbr):
+      self.streams = [NALIndex(vbr), NALIndex(cbr)]
+
+      # Units of each frame of both encodings: (first, last) indices, the 
+      # last one being the VCL unit.
+      self.frames = []
+      for index in self.streams:
+         frames = []
+         first = 0
+         for k in range(len(index)):
+            if int(index.type[k]) in NALIndex.VCL:
+               frames.append((first, k))
+               first = k + 1
+         self.frames.append(frames)
+
+      n = min(len(self.frames[0]), len(self.frames[1]))
+      self.frames = [self.frames[0][:n], self.frames[1][:n]]
+
+   def close(self):
+      for index in self.streams:
+         index.close()
+
+   def __len__(self):
+      return len(self.frames[0])
+
+   # Returns the memory map of the stream of the given encoding.
+   def data(self, cbr = False):
+      return self.streams[cbr].map
+
+   # Returns the list of units (offset, size) of frame j.
+   def units(self, j, cbr = False):
+      index = self.streams[cbr]
+      first, last = self.frames[cbr][j]
+      return [(int(index.start[k]), int(index.size[k])) for k in range(first, last + 1)]
+
+   # Returns the VBR and CBR tracks of the video: the pairs (type, size in 
+   # bytes) of the VCL units of its frames.
+   def tracks(self):
+      tracks = []
+      for index, frames in zip(self.streams, self.frames):
+         tracks.append([(int(index.type[k]), int(index.size[k])) for f, k in frames])
+      return tracks
\ No newline at end of file
@@ -0,0 +1,81 @@
+""" 
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the pacing module, used to release 
+bursts of packets (or frames) at regular instants.
+"""
+
+import os
+import time
+import ctypes
+import ctypes.util
+
+# Monotonic clock, in seconds. Python 2 does not provide one, hence it is read 
+# from clock_gettime when available, and from the wall clock otherwise.
+class timespec(ctypes.Structure):
+   _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+try:
+   CLOCK_MONOTONIC = 1
+   clock_gettime = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', 
+                               use_errno = True).clock_gettime
+   clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+
+   def monotonic():
+      t = timespec()
+      if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+         raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+      return t.tv_sec + t.tv_nsec*1e-9
+
+   monotonic()
+except (OSError, AttributeError):
+   monotonic = getattr(time, 'monotonic', time.time)
+
+###############################################################################
+class Pacer:
+
+   """
+   A Pacer releases events every dt seconds. Deadlines are absolute: the n-th 
+   event is due at t0 + n*dt, so that late or long events do not shift the 
+   following ones. The end of each wait is spent spinning on the clock, which 
+   is more accurate than sleeping. The lateness of the events is recorded.
+   """
+
+   spin = 0.002 # Part of the wait spent spinning (s).
+   tolerance = 0.001 # Lateness above which an event is counted late (s).
+
+   def __init__(self, dt):
+      self.dt = dt
+      self.t0 = monotonic()
+      self.n = 0 # Number of events released.
+      self.late = 0 # Number of late events.
+      self.lateness = 0 # Sum of the lateness of the events.
+      self.max_lateness = 0
+
+   # Returns the deadline of the next event.
+   def deadline(self):
+      return self.t0 + self.n*self.dt
+
+   # Waits for the deadline of the next event and returns its lateness.
+   def wait(self):
+      d = self.deadline()
+      t = monotonic()
+      if d - t > Pacer.spin:
+         time.sleep(d - t - Pacer.spin)
+      while t < d:
+         t = monotonic()
+
+      l = t - d
+      self.n += 1
+      self.lateness += l
+      self.max_lateness = max(self.max_lateness, l)
+      if l > Pacer.tolerance:
+         self.late += 1
+      return l
+
+   # Returns the number of events, late events, the mean and max lateness (s).
+   def stats(self):
+      if self.n == 0:
+         return 0, 0, 0, 0
+      return self.n, self.late, self.lateness/self.n, self.max_lateness
\ No newline at end of file
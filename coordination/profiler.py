@@ -0,0 +1,108 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the frame profiler, which records
+where the time of each frame slot of the senders is spent.
+"""
+
+from array import array
+from pacer import monotonic
+
+###############################################################################
+class FrameProfiler:
+
+   """
+   FrameProfiler measures the phases of each frame of the streaming loop. A
+   frame is started at its release with the deadline of the next one, the
+   end of each phase is marked (the time since the previous mark is added to
+   that phase, a phase can be marked several times), and the frame is ended
+   once sent. The slack is the time left before the next deadline: the frame
+   missed it if negative. The busy time of the frames is kept in a histogram,
+   and every frame in a log if asked for (its memory grows with the stream).
+   """
+
+   phases = ('timeouts', 'flush', 'decision', 'send', 'notify')
+   bin = 0.002 # Width of the bins of the histogram (s).
+
+   def __init__(self, dt, log = True):
+      self.dt = dt
+      self.index = dict((p, k) for k, p in enumerate(FrameProfiler.phases))
+      self.n = 0 # Number of frames.
+      self.missed = 0
+      self.total = array('d', [0]) * len(FrameProfiler.phases)
+      self.max = array('d', [0]) * len(FrameProfiler.phases)
+      self.min_slack = dt
+
+      # The last bin counts the frames longer than dt.
+      self.histogram = array('l', [0]) * (int(dt/FrameProfiler.bin) + 2)
+
+      # Each frame is logged as (index, lateness, phases..., slack).
+      self.log = [] if log else None
+
+   # Starts frame j, released lateness seconds late, which must be sent before
+   # deadline (monotonic clock).
+   def start(self, j, lateness, deadline):
+      self.j = j
+      self.lateness = lateness
+      self.deadline = deadline
+      self.times = [0.] * len(FrameProfiler.phases)
+      self.t0 = self.t = monotonic()
+
+   # Ends the given phase of the current frame.
+   def mark(self, phase):
+      t = monotonic()
+      self.times[self.index[phase]] += t - self.t
+      self.t = t
+
+   # Ends the current frame.
+   def end(self):
+      t = monotonic()
+      slack = self.deadline - t
+      busy = t - self.t0
+
+      self.n += 1
+      if slack < 0:
+         self.missed += 1
+      self.min_slack = min(self.min_slack, slack)
+      for k, d in enumerate(self.times):
+         self.total[k] += d
+         self.max[k] = max(self.max[k], d)
+      last = len(self.histogram) - 1
+      if busy > self.dt:
+         self.histogram[last] += 1
+      else:
+         self.histogram[min(int(busy/FrameProfiler.bin), last - 1)] += 1
+      if self.log is not None:
+         self.log.append(tuple([self.j, self.lateness] + self.times + [slack]))
+
+   # Writes the log of the frames in the file at path, one frame per line.
+   def write(self, path):
+      if self.log is None:
+         return
+      file = open(path, 'w')
+      file.write('# frame lateness %s slack (s)\n' % ' '.join(FrameProfiler.phases))
+      for l in self.log:
+         file.write('%d %.6f %.6f %.6f %.6f %.6f %.6f %.6f\n' % l)
+      file.close()
+
+   # Prints the time spent in each phase, the deadlines missed and the
+   # histogram of the busy time of the frames.
+   def show(self):
+      if self.n == 0:
+         return
+      print self.missed, 'of', self.n, 'frame deadlines missed',
+      print '(min slack %.3f ms)' % (1000*self.min_slack)
+      for k, p in enumerate(FrameProfiler.phases):
+         print '%10s: mean %.3f ms, max %.3f ms' % (p, 1000*self.total[k]/self.n,
+                                                    1000*self.max[k])
+      print 'Busy time of the frames:'
+      last = len(self.histogram) - 1
+      for k, c in enumerate(self.histogram):
+         if not c:
+            continue
+         if k == last:
+            print '%10s: %d' % ('> %d ms' % (1000*self.dt), c)
+         else:
+            print '%10s: %d' % ('%d-%d ms' % (1000*k*FrameProfiler.bin,
+                                              1000*(k + 1)*FrameProfiler.bin), c)
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the reactor, an event loop running
+the servers of a process in a single thread: sockets are read when data comes
+in, and timers are called at their deadline.
+"""
+
+import os
+import errno
+import heapq
+import select
+from pacer import monotonic
+
+###############################################################################
+class Timer:
+
+   """
+   Timer is a callback scheduled by the reactor at a given time, repeated
+   every period seconds if a period is given. It can be cancelled until it is
+   called.
+   """
+
+   def __init__(self, t, period, callback, args):
+      self.t = t
+      self.period = period
+      self.callback = callback
+      self.args = args
+      self.cancelled = False
+
+   def cancel(self):
+      self.cancelled = True
+
+   def __lt__(self, other):
+      return self.t < other.t
+
+###############################################################################
+class Reactor:
+
+   """
+   Reactor is the event loop of a process. Sockets are registered with the
+   callback handling them once readable, and callbacks can be called
+   periodically. Everything runs in the thread calling run(), hence callbacks
+   must not block. Other threads can only stop the loop.
+   """
+
+   def __init__(self):
+      self.ON = True
+      self.readers = {} # Callbacks of the sockets, by file descriptor.
+      self.timers = [] # Heap of the timers, by deadline.
+
+      # Writing on the pipe wakes the loop up.
+      self.r, self.w = os.pipe()
+      self.readers[self.r] = self.wakeup
+
+   def close(self):
+      self.ON = False
+      os.close(self.r)
+      os.close(self.w)
+
+   def isAlive(self):
+      return self.ON
+
+   # Calls callback every time the socket s is readable.
+   def add(self, s, callback):
+      self.readers[s.fileno()] = callback
+
+   # Stops watching the socket s. It must be called before s is closed.
+   def remove(self, s):
+      self.readers.pop(s.fileno(), None)
+
+   # Calls callback(*args) every period seconds. Returns the timer.
+   def every(self, period, callback, *args):
+      timer = Timer(monotonic() + period, period, callback, args)
+      heapq.heappush(self.timers, timer)
+      return timer
+
+   # Ends the loop. It can be called from any thread.
+   def stop(self):
+      self.ON = False
+      self.notify()
+
+   def notify(self):
+      try:
+         os.write(self.w, 'x')
+      except OSError:
+         pass
+
+   def wakeup(self):
+      os.read(self.r, 4096)
+
+   # Returns the time until the next timer, None if there is none.
+   def timeout(self):
+      while self.timers and self.timers[0].cancelled:
+         heapq.heappop(self.timers)
+      if not self.timers:
+         return None
+      return max(0, self.timers[0].t - monotonic())
+
+   # Calls the timers whose deadline has passed.
+   def expire(self):
+      now = monotonic()
+      while self.ON and self.timers and self.timers[0].t <= now:
+         timer = heapq.heappop(self.timers)
+         if timer.cancelled:
+            continue
+         # Periodic timers are scheduled on absolute deadlines, as the pacer.
+         if timer.period is not None:
+            timer.t += timer.period
+            heapq.heappush(self.timers, timer)
+         timer.callback(*timer.args)
+
+   # Loop handling the sockets and the timers until the reactor is stopped, 
+   # possibly before the loop is run.
+   def run(self):
+      while self.ON:
+         try:
+            ready = select.select(list(self.readers), [], [], self.timeout())[0]
+         except select.error, msg:
+            if msg[0] == errno.EINTR:
+               continue
+            raise
+
+         for fd in ready:
+            # A previous callback may have removed the socket.
+            callback = self.readers.get(fd)
+            if callback is not None and self.ON:
+               callback()
+
+         self.expire()
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the schedule of the frames streamed
+by the senders, built once from the parsed video.
+"""
+
+import sys
+import struct
+from array import array
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+###############################################################################
+class Schedule:
+
+   """
+   Schedule holds, for each frame of a video, its type and its sizes (kb) in
+   the VBR and CBR encodings, in compact arrays. The length of the rest of
+   the GOP of each frame and the prefix sums of the sizes are precomputed, so
+   that every lookup is made in constant time. A schedule is never modified
+   once built, hence it can be shared by several senders.
+   """
+
+   IDR = 5 # Type of the frames starting a GOP.
+
+   # Binary format of the schedules (see write): header, with the number of
+   # frames and the summary, followed by the arrays.
+   magic = 'H264SCH\0'
+   version = 1
+   header = struct.Struct('<8sHBBI4d')
+
+   # types, vbr and cbr are the types and the sizes (kb) of the frames.
+   def __init__(self, types, vbr, cbr):
+      self.type = array('B', types)
+      self.vbr = array('d', vbr)
+      self.cbr = array('d', cbr)
+
+      # Number of frames from each frame to the next IDR frame (excluded), or
+      # to the end of the video.
+      n = len(self.type)
+      self.gop = array('l', [1]) * n
+      for j in range(n - 2, -1, -1):
+         if self.type[j + 1] != Schedule.IDR:
+            self.gop[j] = self.gop[j + 1] + 1
+
+      # Prefix sums of the sizes: sum[j] is the size of the frames before j.
+      self.vbr_sum = self.prefix(self.vbr)
+      self.cbr_sum = self.prefix(self.cbr)
+      self.summarize()
+
+   # Computes the summary of both encodings: the mean size of the frames and
+   # the size of the largest GOP (kb), from the prefix sums.
+   def summarize(self):
+      n = len(self.type)
+      self.mean = (self.total(0, n)/n, self.total(0, n, True)/n) if n else (0., 0.)
+      self.peak = (self.peakGOP(), self.peakGOP(True))
+
+   # Returns the size (kb) of the largest GOP, each GOP being summed in 
+   # constant time.
+   def peakGOP(self, cbr = False):
+      peak = 0.
+      j = 0
+      while j < len(self.gop):
+         k = j + self.nextGOP(j)
+         peak = max(peak, self.total(j, k, cbr))
+         j = k
+      return peak
+
+   # Returns the mean rate (kbps) of the video at fps frames per second.
+   def rate(self, fps, cbr = False):
+      return self.mean[cbr] * fps
+
+   def __len__(self):
+      return len(self.type)
+
+   # Builds the schedule of a video from the lists of pairs (type, size) of 
+   # its VBR and CBR encodings, as parsed from a text file.
+   @staticmethod
+   def fromFrames(vbr, cbr):
+      return Schedule([f[0] for f in vbr], [f[1] for f in vbr], [f[1] for f in cbr])
+
+   # Builds the schedule of a video from a frame trace whose tracks are its 
+   # VBR and CBR encodings (see FrameTrace).
+   @staticmethod
+   def fromTrace(trace):
+      vbr = trace.track(0)
+      cbr = trace.track(1)
+      if numpy is not None:
+         return Schedule(vbr['type'].tolist(), (vbr['size']/125.).tolist(), 
+                         (cbr['size']/125.).tolist())
+      return Schedule([f[1] for f in vbr], [f[3]/125. for f in vbr], 
+                      [f[3]/125. for f in cbr])
+
+   # Builds the schedule of a video from its VBR and CBR tracks, given as 
+   # lists of pairs (type, size in bytes) (see NALVideo).
+   @staticmethod
+   def fromTracks(vbr, cbr):
+      return Schedule([f[0] for f in vbr], [f[1]/125. for f in vbr], 
+                      [f[1]/125. for f in cbr])
+
+   @staticmethod
+   def prefix(sizes):
+      s = array('d', [0])
+      total = 0
+      for size in sizes:
+         total += size
+         s.append(total)
+      return s
+
+   # Returns the number of frames of the GOP following frame j, including j
+   # (same as the former Sender.nextGOP).
+   def nextGOP(self, j):
+      return self.gop[j]
+
+   # Returns the size (kb) of the frames i to j (excluded).
+   def total(self, i, j, cbr = False):
+      s = self.cbr_sum if cbr else self.vbr_sum
+      return s[j] - s[i]
+
+   # Writes the schedule in the binary file f, with its precomputed arrays, 
+   # so that it can be read back without being rebuilt. The arrays are in
+   # the byte order of the machine, which is recorded in the header with the
+   # size of their integers.
+   def write(self, f):
+      f.write(Schedule.header.pack(Schedule.magic, Schedule.version, 
+                                   sys.byteorder == 'big', self.gop.itemsize, 
+                                   len(self.type), 
+                                   self.mean[0], self.mean[1], 
+                                   self.peak[0], self.peak[1]))
+      for a in (self.type, self.vbr, self.cbr, self.gop, self.vbr_sum, self.cbr_sum):
+         a.tofile(f)
+
+   # Reads a schedule written by write from the binary file f. Raises 
+   # ValueError if the file is not a schedule of this version and machine.
+   @staticmethod
+   def read(f):
+      data = f.read(Schedule.header.size)
+      if len(data) < Schedule.header.size:
+         raise ValueError('truncated schedule')
+      magic, version, big, itemsize, n, vm, cm, vp, cp = Schedule.header.unpack(data)
+      if magic != Schedule.magic or version != Schedule.version:
+         raise ValueError('not a schedule of version %d' % Schedule.version)
+      if big != (sys.byteorder == 'big') or itemsize != array('l').itemsize:
+         raise ValueError('schedule written on another architecture')
+
+      # The arrays of an empty schedule are filled from the file.
+      schedule = Schedule([], [], [])
+      schedule.mean = (vm, cm)
+      schedule.peak = (vp, cp)
+      del schedule.vbr_sum[:]
+      del schedule.cbr_sum[:]
+      try:
+         for a, k in ((schedule.type, n), (schedule.vbr, n), (schedule.cbr, n), 
+                      (schedule.gop, n), (schedule.vbr_sum, n + 1), 
+                      (schedule.cbr_sum, n + 1)):
+            a.fromfile(f, k)
+      except EOFError:
+         raise ValueError('truncated schedule')
+      return schedule
\ No newline at end of file
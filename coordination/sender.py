@@ -1,304 +1,393 @@
-""" 
-Author: Cedric Bonhomme
-Date: 26-07-2015
-
-This file contains the implementation of the sender class, which is at the
-heart of the coordination protocol. Senders are required to communicate between
-them to use the network in the most optimal way.
-"""
-
-import sys
-import time
-import Queue
-from udpmodule import *
-from tcpmodule import *
-
-class Sender:
-
-   """
-   A Sender is a program streaming H264 content to its related Listener. It 
-   has two different encodings (CBR and VBR) and choose which one to send to 
-   get the maximum fidelity and avoid losses. To do that, it handles TCP 
-   connections with other senders, in order to exploit the network's 
-   characteristics, computed by the measurement tool.
-   """
-
-   fps = 30
-   dt = float(1)/float(fps)
-   expiration = 5
-   rounding = 100
-   
-   def __init__(self, src, params, cbr, vbr):
-      self.ON = True
-
-      # IP addresses.
-      self.src = src
-      self.dest = params[0]
-      
-      # CBR and VBR encodings of the video to stream.
-      self.cbr = cbr
-      self.vbr = vbr
-
-      # A neighbour is a sender with:
-      # - its IP address
-      # - the bandwidth margin (rho - rho")
-      # - the future instant when it will switch back to VBR (-1 by default).
-      self.sources = []
-
-      self.sigma = params[1][1]
-      self.sig = self.sigma
-
-      # Case 1: the sender is alone.
-      if len(params) == 2:
-         self.base_frame_size = (params[1][0]/Sender.fps)
-         
-      # Case 2: the sender is probably correlated with other sources.
-      else:
-         self.base_frame_size = (params[2]/Sender.fps)
-
-         # Computing the bandwidth gain for the current source, regarding the 
-         # others: a list (ip_address, delta_rho, sigma) is kept for each source 
-         # with sigma unknown.
-         for i in range(3, len(params)):
-            margin =  ((params[i][1] - params[2])/Sender.fps)
-            self.sources.append([params[i][0], margin, -1])
-
-      # The actual neighbours are kept in another list, if the margin is not 0.
-      # For those neighbours, two elements are added: a timeout (initially undef)
-      # and a boolean (true for correlated neighbours, false for the others).
-      self.cN = []
-      for n in self.sources:
-         if n[1] != 0:
-            self.cN.append([n[0], n[1], n[2], -1, True])
- 
-      self.nm = 0
-      
-      # Starting the udpClient and the tcpServer.
-      self.udpClient = UDPClient(self.dest)
-      self.tcp_queue = Queue.Queue()
-      self.tcpServer = TCPServer(self.src, self.tcp_queue)
-      self.tcpServer.start()
-      self.ON = self.tcpServer.isAlive() and self.udpClient.isAlive()
-      
-   def close(self):
-      print 'Shutting down...'
-      self.udpClient.close()
-      self.tcpServer.close()
-      self.tcpServer.join()
-      self.ON = self.tcpServer.isAlive() and self.udpClient.isAlive()
-      print 'Closed.'
-      
-   def isAlive(self):
-      return self.ON
-      
-   # This method waits for an incoming TCP packet and a specific payload_type.
-   # It returns the payload attributes if any.
-   def wait(self, addr, payload_type):
-      while self.isAlive():
-         try:
-            p, src = self.tcp_queue.get(True, Sender.expiration)
-            if src == addr and p[0] == payload_type:
-               return p[1]
-            else:
-               self.tcp_queue.put((p, src))
-         except Queue.Empty:
-            self.ON = self.tcpServer.isAlive()
-      raise Exception()
-
-   # Based on an IP address, returns the index of the neighbour.
-   # -1 if it does not belong to the list of neighbours.
-   def isNeighbour(self, addr):
-      for k in range(len(self.cN)):
-         if addr == self.cN[k][0]:
-            return k
-      return -1
-      
-   # Based on an IP address, returns the index of the source.
-   # -1 if it does not belong to the list of sources.
-   def isSource(self, addr):
-      for k in range(len(self.sources)):
-         if addr == self.sources[k][0]:
-            return self.sources[k]
-      return None
-   
-   # Gathers the TCP messages from the TCP queue. If the sender 
-   # is not a neighbour, a 'prune' message is replied.
-   def flush_queue(self):
-      msgs = []
-      try:
-         while True:
-             p, addr = self.tcp_queue.get(False)
-             src = self.isNeighbour(addr)
-             if src != -1:
-                msgs.append((src, p))
-             elif p[0] == 'prune':
-                src = self.isSource(addr)
-                if src:
-                   self.notify(addr, 'prune', [self.sigma])
-                   self.cN.append([src[0], src[1], p[1][0], -1, False])
-                   self.updateSigma()
-
-      finally:
-         return msgs
-
-   # Encapsulation of the TCPClient send method.
-   def notify(self, dest, payload_type, attr = None):
-      self.nm += 1
-      print dest, payload_type
-      return TCPClient.send(dest, payload_type, attr)
-
-   # Notifies all the neighbours.
-   def notifyAll(self, payload_type, attr = None):
-      ack = True
-      for cn in self.cN:
-         ack = ack and self.notify(cn[0], payload_type, attr)
-      return ack
-         
-   def updateSigma(self):
-      self.sig = self.sigma
-      for cn in self.cN:
-         self.sig = min(self.sig,cn[2])
-      self.sig /= (1 + len(self.cN))
-      
-   def nextGOP(self, j):
-      n = 1;
-      for i in range(j+1, len(self.vbr)):
-         if self.vbr[i][0] == 5:
-            break
-         else:
-            n += 1
-      return n
-   
-   def findIndex(self):
-      tmp = self.src.split('.')
-      c = int(tmp[len(tmp)-1])
-      j = -1
-      k = 10
-      a = -1
-      b = -1
-      for i in range(len(self.sources)):
-         tmp = self.sources[i][0].split('.')
-         x = int(tmp[len(tmp)-1])
-         if x > j and x < c:
-            j = x
-            a = i
-         elif x > c and x < k:
-            k = x
-            b = i
-      return a,b
-      
-   # Main method, running the coordination protocol.
-   def run(self, rounds=1):
-
-      a,b = self.findIndex()
-
-      if a != -1:
-         self.wait(self.sources[a][0], 'turn')
-      
-      # Pruning the neighbours with sigma.
-      self.notifyAll('prune', [self.sigma])
-
-      if b != -1:
-         self.notify(self.sources[a][0], 'turn')
-
-      # Waiting for their answer.
-      for k in range(len(self.cN)):
-         p = self.wait(self.cN[k][0], 'prune')
-         self.cN[k][2] = p[0]
-   
-      # Sigma is computed.
-      self.updateSigma()
-
-      # Opening the connection at the listener side.
-      if not self.notify(self.dest, 'init_stream'):
-         return
-      time.sleep(1)  
-
-      # Initialization of the different parameters.
-      cbr_frame_size = 1500/Sender.fps
-      vbr_frame_size = self.base_frame_size
-      delta_size = 0
-      buffer = 0
-      CBR = 0      
-      s_tot = 0
-      f = 0
-      GOP = self.nextGOP(0)
-      log = []
-      
-      # The video is streamed several times.
-      for i in range(rounds):
-         for j in range(len(self.vbr)):
-            t = time.time()
-            
-            # Switching back to VBR at the end of the GOP.
-            if f == GOP:
-               f = 0
-               GOP = self.nextGOP(j)
-               if CBR:
-                  CBR = 0
-                  
-            # Implicit switch to VBR: the frame size is decreased.
-            for i in range(len(self.cN)):
-               # Implicit: a timeout is given.
-               if self.cN[i][3] != -1 and self.cN[i][3] <= t:
-                  self.cN[i][3] = -1
-                  delta_size -= self.cN[i][1]
-            
-            # Handling incoming messages from neighbours. These neighbours 
-            # must be correlated (i.e. influence the local source).
-            msgs = self.flush_queue()
-            for msg in msgs:
-               if msg[1][0] == 'switch' and self.cN[msg[0]][4]:
-                  self.cN[msg[0]][3] = msg[1][1][0]
-                  delta_size += self.cN[msg[0]][1]
-
-            # Case 1: If streaming in CBR, stay in CBR.
-            if CBR:
-               s = self.cbr[j][1]
-            # Case 2: the VBR frame is too large, even for the buffer.
-            # In this case, switch to CBR instantaneously.
-            elif self.vbr[j][1] - (vbr_frame_size + delta_size) > self.sig - buffer:
-               CBR = 1
-               print t
-               self.notifyAll('switch', [t + (GOP - f)*Sender.dt])
-               s = self.cbr[j][1]
-            # Case 3: sending the VBR frame.
-            else:
-               s = self.vbr[j][1]
-            
-            # Sending the most appropriate frame.
-            self.udpClient.send(s)
-            
-            # Buffering capacity refreshment.
-            if CBR:
-               buffer += s - (cbr_frame_size + delta_size)
-               buffer = max(0, min(self.sig, buffer))
-               log.append((self.sig, buffer, (cbr_frame_size + delta_size), s, CBR))
-            else:
-               buffer += s - (vbr_frame_size + delta_size)
-               buffer = max(0, min(self.sig, buffer))
-               log.append((self.sig, buffer, (vbr_frame_size + delta_size), s, CBR))
-               
-            # Going to the next frame of the GOP.
-            f += 1
-            
-            # Waiting for the next frame.
-            time.sleep(max(0, Sender.dt - (time.time() - t)))
-      
-      # Closing the connection at the listener side.
-      time.sleep(1)
-      if not self.notify(self.dest, 'close_stream'):
-         return
-
-      # Waiting for the listener statistics and print them.
-      lL = self.wait(self.dest, 'close_ack')
-      
-      file = open('data%s.txt' % self.src, 'w')
-      for l in log:
-         file.write('%010.3f %010.3f %010.3f %010.3f %d\n' % l)
-      
-      print sum(lL[0])/len(lL[0]), 'kbps'
-      print sum(lL[1]), 'packets dropped'
-      print self.nm, 'messages sent'
-      
+""" 
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the sender class, which is at the
+heart of the coordination protocol. Senders are required to communicate between
+them to use the network in the most optimal way.
+"""
+
+import sys
+import time
+import heapq
+import Queue
+from udpmodule import *
+from tcpmodule import *
+from pacer import Pacer
+from profiler import FrameProfiler
+
+class Sender:
+
+   """
+   A Sender is a program streaming H264 content to its related Listener. It 
+   has two different encodings (CBR and VBR) and choose which one to send to 
+   get the maximum fidelity and avoid losses. To do that, it handles TCP 
+   connections with other senders, in order to exploit the network's 
+   characteristics, computed by the measurement tool.
+   """
+
+   fps = 30
+   dt = float(1)/float(fps)
+   expiration = 5
+   rounding = 100
+   report = 1 # Period of the reports of the listener (s), 0 for none.
+   profile = False # Whether the phases of every frame are logged (--profile).
+   spread = 0 # Part of the frame interval over which packets are spread.
+   
+   def __init__(self, src, params, schedule, video = None):
+      self.ON = True
+
+      # IP addresses.
+      self.src = src
+      self.dest = params[0]
+      
+      # CBR and VBR encodings of the video to stream (see Schedule). If the 
+      # video is given (see NALVideo), its NAL units are sent instead of 
+      # padding.
+      self.schedule = schedule
+      self.video = video
+      self.units = 0 # Number of NAL units sent.
+      self.frames = 0 # Number of frames sent.
+
+      # A neighbour is a sender with:
+      # - its IP address
+      # - the bandwidth margin (rho - rho")
+      # - the future instant when it will switch back to VBR (-1 by default).
+      self.sources = []
+
+      self.sigma = params[1][1]
+      self.sig = self.sigma
+      self.sig_min = None # Minimum sigma, known once the neighbours replied.
+
+      # Case 1: the sender is alone.
+      if len(params) == 2:
+         self.base_frame_size = (params[1][0]/Sender.fps)
+         
+      # Case 2: the sender is probably correlated with other sources.
+      else:
+         self.base_frame_size = (params[2]/Sender.fps)
+
+         # Computing the bandwidth gain for the current source, regarding the 
+         # others: a list (ip_address, delta_rho, sigma) is kept for each source 
+         # with sigma unknown.
+         for i in range(3, len(params)):
+            margin =  ((params[i][1] - params[2])/Sender.fps)
+            self.sources.append([params[i][0], margin, -1])
+
+      # The actual neighbours are kept in another list, if the margin is not 0.
+      # For those neighbours, two elements are added: a timeout (initially undef)
+      # and a boolean (true for correlated neighbours, false for the others).
+      # Sources and neighbours are indexed by address (index in their list),
+      # and the sources which are not neighbours are kept in a set.
+      self.source = dict((n[0], k) for k, n in enumerate(self.sources))
+      self.cN = []
+      self.neighbours = {}
+      self.others = set(self.source)
+      for n in self.sources:
+         if n[1] != 0:
+            self.addNeighbour([n[0], n[1], n[2], -1, True])
+
+      # Min-heap of the timeouts of the neighbours: (timeout, index). Entries 
+      # whose timeout was replaced since are skipped when popped.
+      self.timeouts = []
+ 
+      self.nm = 0
+      self.reports = 0 # Number of reports received from the listener.
+      
+      # Starting the udpClient and the tcpServer.
+      self.flow = 0 # Identifier of the UDP stream at the listener side.
+      self.udpClient = UDPClient(self.dest, self.flow, Sender.spread*Sender.dt)
+      self.mailbox = TCPMailbox()
+      self.outbox = TCPOutbox()
+      self.tcpServer = TCPServer(self.src, self.mailbox)
+      self.tcpServer.start()
+      self.ON = self.tcpServer.isAlive() and self.udpClient.isAlive()
+      
+   def close(self):
+      print 'Shutting down...'
+      self.udpClient.close()
+      self.outbox.close()
+      sent, failed, expired, merged, mean, worst = self.outbox.stats()
+      print 'Switch notifications: %d sent (latency: mean %.3f ms, max %.3f ms),' % \
+            (sent, 1000*mean, 1000*worst),
+      print '%d failed, %d expired, %d coalesced' % (failed, expired, merged)
+      self.tcpServer.close()
+      self.tcpServer.join()
+      TCPClient.close()
+      self.ON = self.tcpServer.isAlive() and self.udpClient.isAlive()
+      print 'Closed.'
+      
+   def isAlive(self):
+      return self.ON
+      
+   # This method waits for an incoming TCP packet and a specific payload_type.
+   # It returns the payload attributes if any.
+   def wait(self, addr, payload_type):
+      while self.isAlive():
+         try:
+            return self.mailbox.get(addr, payload_type, Sender.expiration)[1]
+         except Queue.Empty:
+            self.ON = self.tcpServer.isAlive()
+      raise Exception()
+
+   # Based on an IP address, returns the index of the neighbour.
+   # -1 if it does not belong to the list of neighbours.
+   def isNeighbour(self, addr):
+      return self.neighbours.get(addr, -1)
+      
+   # Based on an IP address, returns the source.
+   # None if it does not belong to the list of sources.
+   def isSource(self, addr):
+      k = self.source.get(addr)
+      return self.sources[k] if k is not None else None
+
+   # Adds a neighbour, given as [address, margin, sigma, timeout, correlated],
+   # and updates sigma with its own.
+   def addNeighbour(self, cn):
+      self.neighbours[cn[0]] = len(self.cN)
+      self.others.discard(cn[0])
+      self.cN.append(cn)
+      if self.sig_min is not None:
+         self.sig_min = min(self.sig_min, cn[2])
+         self.sig = self.sig_min / (1 + len(self.cN))
+
+   # Sets the timeout of neighbour k, when it switches back to VBR.
+   def setTimeout(self, k, timeout):
+      self.cN[k][3] = timeout
+      heapq.heappush(self.timeouts, (timeout, k))
+
+   # Expires the timeouts passed at time t. Returns the sum of the margins of
+   # the neighbours switched back to VBR.
+   def expire(self, t):
+      delta = 0
+      while self.timeouts and self.timeouts[0][0] <= t:
+         timeout, k = heapq.heappop(self.timeouts)
+         if self.cN[k][3] == timeout:
+            self.cN[k][3] = -1
+            delta += self.cN[k][1]
+      return delta
+   
+   # Gathers the TCP messages of the neighbours from the mailbox. If another 
+   # source asks to prune, it becomes a neighbour and a 'prune' message is 
+   # replied. Messages from other senders are left in the mailbox.
+   def flush_queue(self):
+      msgs = []
+      for p, addr in self.mailbox.drain(self.neighbours):
+         msgs.append((self.isNeighbour(addr), p))
+
+      for p, addr in self.mailbox.drain(self.others, ['prune']):
+         src = self.isNeighbour(addr)
+         if src != -1:
+            msgs.append((src, p))
+         else:
+            src = self.isSource(addr)
+            self.notify(addr, 'prune', [self.sigma])
+            self.addNeighbour([src[0], src[1], p[1][0], -1, False])
+      return msgs
+
+   # Handles the reports sent by the listener during the stream.
+   def read_reports(self):
+      for p, addr in self.mailbox.drain([self.dest], ['report']):
+         self.reports += 1
+         flow, dt, goodput, received, lost, late, first_loss = p[1]
+         print 'Report: %d kbps, %d received, %d lost, %d late' % (goodput, received, lost, late),
+         if first_loss != -1:
+            print '(first loss after %.3f s)' % first_loss
+         else:
+            print
+
+   # Encapsulation of the TCPClient send method.
+   def notify(self, dest, payload_type, attr = None):
+      self.nm += 1
+      print dest, payload_type
+      return TCPClient.send(dest, payload_type, attr)
+
+   # Notifies all the neighbours.
+   def notifyAll(self, payload_type, attr = None):
+      ack = True
+      for cn in self.cN:
+         ack = ack and self.notify(cn[0], payload_type, attr)
+      return ack
+
+   # Notifies all the neighbours without waiting for the messages to be sent,
+   # which are dropped after lifetime seconds (see TCPOutbox).
+   def postAll(self, payload_type, attr = None, lifetime = None):
+      for cn in self.cN:
+         self.nm += 1
+         print cn[0], payload_type
+         self.outbox.post(cn[0], payload_type, attr, lifetime)
+         
+   # Computes sigma from those of the neighbours. Their minimum is then kept 
+   # up to date as neighbours are added (see addNeighbour).
+   def updateSigma(self):
+      self.sig_min = self.sigma
+      for cn in self.cN:
+         self.sig_min = min(self.sig_min, cn[2])
+      self.sig = self.sig_min / (1 + len(self.cN))
+      
+   def findIndex(self):
+      tmp = self.src.split('.')
+      c = int(tmp[len(tmp)-1])
+      j = -1
+      k = 10
+      a = -1
+      b = -1
+      for i in range(len(self.sources)):
+         tmp = self.sources[i][0].split('.')
+         x = int(tmp[len(tmp)-1])
+         if x > j and x < c:
+            j = x
+            a = i
+         elif x > c and x < k:
+            k = x
+            b = i
+      return a,b
+      
+   # Main method, running the coordination protocol.
+   def run(self, rounds=1):
+
+      a,b = self.findIndex()
+
+      if a != -1:
+         self.wait(self.sources[a][0], 'turn')
+      
+      # Pruning the neighbours with sigma.
+      self.notifyAll('prune', [self.sigma])
+
+      if b != -1:
+         self.notify(self.sources[a][0], 'turn')
+
+      # Waiting for their answer.
+      for k in range(len(self.cN)):
+         p = self.wait(self.cN[k][0], 'prune')
+         self.cN[k][2] = p[0]
+   
+      # Sigma is computed.
+      self.updateSigma()
+
+      # Opening the connection at the listener side.
+      if not self.notify(self.dest, 'init_stream', 
+                         [self.flow, Sender.report, self.video is not None]):
+         return
+      time.sleep(1)  
+
+      # Initialization of the different parameters.
+      cbr_frame_size = 1500/Sender.fps
+      vbr_frame_size = self.base_frame_size
+      delta_size = 0
+      buffer = 0
+      CBR = 0      
+      s_tot = 0
+      f = 0
+      GOP = self.schedule.nextGOP(0)
+      cbr = self.schedule.cbr
+      vbr = self.schedule.vbr
+      log = []
+      
+      # Frames are released on absolute deadlines.
+      pacer = Pacer(Sender.dt)
+      profiler = FrameProfiler(Sender.dt, Sender.profile)
+
+      # The video is streamed several times.
+      for i in range(rounds):
+         for j in range(len(self.schedule)):
+            lateness = pacer.wait()
+            profiler.start(j, lateness, pacer.deadline())
+            t = time.time()
+            
+            # Switching back to VBR at the end of the GOP.
+            if f == GOP:
+               f = 0
+               GOP = self.schedule.nextGOP(j)
+               if CBR:
+                  CBR = 0
+                  
+            # Implicit switch to VBR: the frame size is decreased.
+            # Implicit: a timeout is given.
+            delta_size -= self.expire(t)
+            profiler.mark('timeouts')
+            
+            # Handling incoming messages from neighbours. These neighbours 
+            # must be correlated (i.e. influence the local source).
+            msgs = self.flush_queue()
+            self.read_reports()
+            for msg in msgs:
+               if msg[1][0] == 'switch' and self.cN[msg[0]][4]:
+                  self.setTimeout(msg[0], msg[1][1][0])
+                  delta_size += self.cN[msg[0]][1]
+            profiler.mark('flush')
+
+            # Case 1: If streaming in CBR, stay in CBR.
+            if CBR:
+               s = cbr[j]
+            # Case 2: the VBR frame is too large, even for the buffer.
+            # In this case, switch to CBR instantaneously.
+            elif vbr[j] - (vbr_frame_size + delta_size) > self.sig - buffer:
+               CBR = 1
+               print t
+               profiler.mark('decision')
+               # The switch is useless to the neighbours after the GOP.
+               self.postAll('switch', [t + (GOP - f)*Sender.dt], (GOP - f)*Sender.dt)
+               profiler.mark('notify')
+               s = cbr[j]
+            # Case 3: sending the VBR frame.
+            else:
+               s = vbr[j]
+            
+            # Sending the most appropriate frame.
+            profiler.mark('decision')
+            if self.video is not None:
+               units = self.video.units(j, CBR)
+               self.udpClient.sendNAL(self.video.data(CBR), units)
+               self.units += len(units)
+            else:
+               self.udpClient.send(s)
+            self.frames += 1
+            profiler.mark('send')
+            
+            # Buffering capacity refreshment.
+            if CBR:
+               buffer += s - (cbr_frame_size + delta_size)
+               buffer = max(0, min(self.sig, buffer))
+               log.append((self.sig, buffer, (cbr_frame_size + delta_size), s, CBR))
+            else:
+               buffer += s - (vbr_frame_size + delta_size)
+               buffer = max(0, min(self.sig, buffer))
+               log.append((self.sig, buffer, (vbr_frame_size + delta_size), s, CBR))
+               
+            # Going to the next frame of the GOP.
+            f += 1
+            profiler.mark('decision')
+            profiler.end()
+      
+      # Closing the connection at the listener side.
+      time.sleep(1)
+      if not self.notify(self.dest, 'close_stream', [self.flow]):
+         return
+
+      # Waiting for the listener statistics and print them.
+      lL = self.wait(self.dest, 'close_ack')
+      
+      file = open('data%s.txt' % self.src, 'w')
+      for l in log:
+         file.write('%010.3f %010.3f %010.3f %010.3f %d\n' % l)
+      
+      print lL[0], 'kbps'
+      print lL[1], 'packets dropped'
+      print 'Arrival times taken from the', lL[2], 'clock'
+      print 'Envelope: sigma =', lL[3], 'kb'
+      print 'Rate per second: min %d, max %d, mean %d kbps' % tuple(lL[4:7])
+      print 'Arrival curve:', ', '.join('%.0f kb in %g ms' % (b, 1000*tau) 
+                                        for tau, b in zip(UDPFlow.taus, lL[7]))
+      if len(lL) > 8:
+         print 'Decodable: %d of %d NAL units, %d of %d frames, %d broken' % \
+               (lL[8], self.units, lL[9], self.frames, lL[10])
+      print self.nm, 'messages sent'
+      print self.reports, 'reports received'
+      n, late, mean, worst = pacer.stats()
+      print late, 'of', n, 'frames sent late',
+      print '(lateness: mean %.3f ms, max %.3f ms)' % (1000*mean, 1000*worst)
+      profiler.show()
+      profiler.write('profile%s.txt' % self.src)
+      
       file.close()
\ No newline at end of file
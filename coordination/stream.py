@@ -1,101 +1,178 @@
-#!/usr/bin/python
-
-""" 
-Author: Cedric Bonhomme
-Date: 26-07-2015
-
-This file consists of the interface of the coordination tool.
-"""
-
-import sys
-import time
-from sender import Sender
-from listener import Listener
-
-# Parsing the file containing the results of the measurement tool.
-def parse_params(src):
-   params = []
-   l = 0
-   try:
-      file = open(src, 'r')
-      
-      for line in file:
-         line = line.strip()         
-         if not line:
-            continue
-         
-         # IP address of the listener.
-         if l == 0:
-            params.append(line)
-         # Pair (rho, sigma).
-         elif l == 1:
-            tmp = line.split()
-            params.append((int(tmp[0]), int(tmp[1])))
-         # Rho'.
-         elif l == 2:
-            params.append(int(line))
-         # Rho".
-         else:
-            tmp = line.split()
-            params.append((tmp[0], int(tmp[1])))
-            
-         l += 1
-         
-   except IOError: 
-      print 'Cannot open', src
-      params = None
-   finally:
-      file.close()
-      return params
-
-# Parsing the file containing the list of frame sizes of a video.
-def parse_h264(f):
-   cbr = []
-   vbr = []
-   try:
-      file = open(f, 'r')
-
-      for line in file:
-         line = line.strip()
-         if not line:
-            continue
-         
-         tmp = line.split()
-         vbr.append((int(tmp[0]), float(tmp[1])))
-         cbr.append((int(tmp[2]), float(tmp[3])))
-            
-      frames = (vbr, cbr)
-   except IOError: 
-      print 'Cannot open', f
-      frames = None
-   finally:
-      file.close()
-      return frames
-         
-# Sender side.
-if len(sys.argv) == 4 and sys.argv[1] == '--send':
-   params = parse_params(sys.argv[2])
-   frames = parse_h264(sys.argv[3])
-   if not params or not frames:
-      sys.exit(0)
-
-   print 'Streaming from', sys.argv[2], 'to', params[0]
-   time.sleep(1)
-   sender = Sender(sys.argv[2], params, frames[1], frames[0])
-   if sender.isAlive():
-      sender.run(1)
-   sender.close()
-   
-# Listener side.
-elif len(sys.argv) == 3 and sys.argv[1] == '--listen':
-   print 'Listening at', sys.argv[2]
-   listener = Listener(sys.argv[2])
-   if listener.isAlive():
-      listener.run()
-   listener.close()
-   
-else:
-   print 'Wrong usage'
-   print 'python stream.py [--send|--listen] addr'
-   
+#!/usr/bin/python
+
+""" 
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file consists of the interface of the coordination tool.
+"""
+
+import sys
+import time
+from sender import Sender
+from listener import Listener
+from schedule import Schedule
+from cache import ScheduleCache
+from frametrace import *
+from nalindex import *
+
+# Parsing the file containing the results of the measurement tool.
+def parse_params(src):
+   params = []
+   l = 0
+   try:
+      file = open(src, 'r')
+      
+      for line in file:
+         line = line.strip()         
+         if not line:
+            continue
+         
+         # IP address of the listener.
+         if l == 0:
+            params.append(line)
+         # Pair (rho, sigma).
+         elif l == 1:
+            tmp = line.split()
+            params.append((int(tmp[0]), int(tmp[1])))
+         # Rho'.
+         elif l == 2:
+            params.append(int(line))
+         # Rho".
+         else:
+            tmp = line.split()
+            params.append((tmp[0], int(tmp[1])))
+            
+         l += 1
+         
+   except IOError: 
+      print 'Cannot open', src
+      params = None
+   finally:
+      file.close()
+      return params
+
+# Parsing the file containing the list of frame sizes of a video, either as 
+# text or as a frame trace. Returns its schedule, from the cache if the file 
+# was already parsed.
+def parse_h264(f):
+   return ScheduleCache().load(load_h264, f)
+
+def load_h264(f):
+   try:
+      if FrameTrace.isTrace(f):
+         trace = FrameTrace(f)
+         frames = Schedule.fromTrace(trace)
+         trace.close()
+         return frames
+
+      vbr = []
+      cbr = []
+      file = open(f, 'r')
+
+      for line in file:
+         line = line.strip()
+         if not line:
+            continue
+         
+         tmp = line.split()
+         vbr.append((int(tmp[0]), float(tmp[1])))
+         cbr.append((int(tmp[2]), float(tmp[3])))
+            
+      file.close()
+      frames = Schedule.fromFrames(vbr, cbr)
+   except (IOError, ValueError), msg:
+      print 'Cannot open', f, msg
+      frames = None
+   finally:
+      return frames
+         
+# Parsing the raw H.264 streams of the VBR and CBR encodings of a video, whose 
+# NAL units are sent. Returns the video and its schedule, from the cache if 
+# both streams were already parsed.
+def parse_streams(vbr, cbr):
+   try:
+      video = NALVideo(vbr, cbr)
+   except (EnvironmentError, ValueError), msg:
+      print 'Cannot open', vbr, cbr, msg
+      return None, None
+   tracks = lambda vbr, cbr: Schedule.fromTracks(*video.tracks())
+   return video, ScheduleCache().load(tracks, vbr, cbr)
+
+# The phases of every frame sent are logged with --profile.
+if '--profile' in sys.argv:
+   sys.argv.remove('--profile')
+   Sender.profile = True
+
+# Sender side: the video is either the list of its frame sizes, or its raw 
+# streams.
+if len(sys.argv) in (4, 5) and sys.argv[1] == '--send':
+   params = parse_params(sys.argv[2])
+   if len(sys.argv) == 5:
+      video, frames = parse_streams(sys.argv[3], sys.argv[4])
+   else:
+      video, frames = None, parse_h264(sys.argv[3])
+   if not params or frames is None:
+      sys.exit(0)
+
+   print 'Streaming from', sys.argv[2], 'to', params[0]
+   print len(frames), 'frames, mean rate', frames.rate(Sender.fps), 'kbps,', 
+   print 'peak GOP', frames.peak[0], 'kb'
+   time.sleep(1)
+   sender = Sender(sys.argv[2], params, frames, video)
+   if sender.isAlive():
+      sender.run(1)
+   sender.close()
+   if video is not None:
+      video.close()
+   
+# Listener side.
+elif len(sys.argv) in (3, 4) and sys.argv[1] == '--listen':
+   print 'Listening at', sys.argv[2]
+
+   # The servers can be run by a single event loop.
+   evented = len(sys.argv) == 4 and sys.argv[3] == '--evented'
+   listener = Listener(sys.argv[2], evented)
+   if listener.isAlive():
+      listener.run()
+   listener.close()
+   
+# Conversion of text outputs into a frame trace: either a video (or an output 
+# of h264), or the outputs of h264 for the VBR and CBR encodings of a video, 
+# whose VCL units are kept.
+elif len(sys.argv) in (4, 5) and sys.argv[1] == '--convert':
+   try:
+      if len(sys.argv) == 5:
+         tracks = [parse_nal(sys.argv[2], True), parse_nal(sys.argv[3], True)]
+      elif isNAL(sys.argv[2]):
+         tracks = [parse_nal(sys.argv[2])]
+      else:
+         tracks = parse_video(sys.argv[2])
+      FrameTrace.write(sys.argv[-1], tracks)
+      print len(tracks[0]), 'frames written in', sys.argv[-1]
+   except (IOError, ValueError), msg:
+      print 'Cannot convert:', msg
+
+# Indexing of raw H.264 streams into a frame trace: either the VCL units of the 
+# VBR and CBR encodings of a video, or all the units of a single stream.
+elif len(sys.argv) in (4, 5) and sys.argv[1] == '--index':
+   try:
+      if len(sys.argv) == 5:
+         tracks = index_video(sys.argv[2], sys.argv[3])
+      else:
+         index = NALIndex(sys.argv[2])
+         tracks = [index.units()]
+         index.close()
+      FrameTrace.write(sys.argv[-1], tracks)
+      print len(tracks[0]), 'frames written in', sys.argv[-1]
+   except (IOError, ValueError), msg:
+      print 'Cannot index:', msg
+
+else:
+   print 'Wrong usage'
+   print 'python stream.py [--send|--listen] addr'
+   print 'python stream.py --send addr [video|vbr.h264 cbr.h264] [--profile]'
+   print 'python stream.py --convert [video|vbr cbr] trace'
+   print 'python stream.py --index [stream.h264|vbr.h264 cbr.h264] trace'
+   
 sys.exit(0)
\ No newline at end of file
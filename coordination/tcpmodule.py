@@ -1,105 +1,624 @@
-""" 
-Author: Cedric Bonhomme
-Date: 19-07-2015
-
-This file contains the implementation of the TCP module, used to handle out of 
-band requests, both in senders and listeners.
-"""
-
-import socket
-import json
-from threading import Thread
-
-class TCPPacket:
-   
-   """
-   TCPPacket is a data structure containing a message, together with 0 or more
-   attributes. The class is encoded/decoded into json before/after its sending.
-   It contains only two static methods.
-   """
-
-   @staticmethod
-   def encode(type, attr = None):
-      return json.dumps((type, attr))
-
-   @staticmethod
-   def decode(data):
-      p = json.loads(data)
-      return(str(p[0]), p[1])
-
-###############################################################################
-class TCPServer(Thread):
-
-    """
-    TCPServer is a Thread that handles incoming out of band requests.
-    """
-
-    port = 5000
-    max_connections = 50
-    expiration = 5
-    
-    def __init__(self, addr, q):
-       Thread.__init__(self)
-       try:
-          self.ON = True
-          self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-          self.s.bind((addr, TCPServer.port))
-          self.s.settimeout(TCPServer.expiration)
-          self.s.listen(TCPServer.max_connections)
-          self.q = q
-       except socket.error, msg:
-          print 'Socket creation error:', msg
-          self.ON = False
-
-    def close(self):
-       self.ON = False
-       self.s.close()
-            
-    def isAlive(self):
-       return self.ON
-
-    def run(self):
-       while self.ON:
-          # Incoming packets are put in the queue and the connection is closed.
-          try:
-             input, addr = self.s.accept()
-             self.q.put(self.handle(input, addr[0]))
-             input.close()
-             
-          # The timeout allows to close the server properly.
-          except socket.timeout:
-             continue
-          except socket.error, msg:
-             print 'Socket error:', msg
-             self.ON = False
-             input.close()
-    
-    # Messages are reconstructed and decoded.
-    def handle(self, input, addr):
-       data = ''
-       while True:
-            d = input.recv(1024)
-            if d: data += d
-            else: return TCPPacket.decode(data), addr
-
-###############################################################################
-class TCPClient:
-
-   """
-   TCPClient is a class sending out of band messages. It is made of a single 
-   static method, sending a string msg to the specified addr.
-   """
-
-   @staticmethod
-   def send(addr, payload_type, payload_attributes = None):
-      try:
-         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-         s.connect((addr, TCPServer.port))
-         s.sendall(TCPPacket.encode(payload_type, payload_attributes))
-         ACK = True
-      except socket.error, msg:
-         print 'Unable to send TCP message:', msg
-         ACK = False
-      finally:
-         s.close()
-         return ACK
\ No newline at end of file
+""" 
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the implementation of the TCP module, used to handle out of 
+band requests, both in senders and listeners.
+"""
+
+import time
+import errno
+import socket
+import struct
+import Queue
+import select
+from threading import Thread, Lock, Condition
+from collections import deque
+
+class TCPPacket:
+   
+   """
+   TCPPacket is a data structure containing a message, together with 0 or more
+   attributes. The class is encoded/decoded into a compact binary format 
+   before/after its sending: a version and flags, the type of the message, 
+   then its attributes. Each value is tagged with its type, and lists of 
+   numbers are packed as arrays. On the wire, each message is prefixed by its 
+   length, so that several messages can share the same connection. Messages 
+   between logical addresses (see TCPClient) also carry their source and 
+   destination.
+   """
+
+   length = struct.Struct('!I')
+   header = struct.Struct('!BBB') # Version, flags and type of the message.
+   version = 1
+
+   # Flags telling if the logical source and destination are given.
+   SRC = 1
+   DST = 2
+
+   # Types of the messages, encoded by their index. Other types are encoded as 
+   # strings. New types must be appended, so that the indices do not change.
+   types = ['init_stream', 'close_stream', 'close_ack', 'start', 'finish', 
+            'continue', 'stop', 'prune', 'turn', 'switch', 'report']
+   other = 255
+
+   count = struct.Struct('!I')
+   int32 = struct.Struct('!i')
+   int64 = struct.Struct('!q')
+   double = struct.Struct('!d')
+
+   @staticmethod
+   def encode(type, attr = None, src = None, dst = None):
+      flags = 0
+      if src is not None: flags |= TCPPacket.SRC
+      if dst is not None: flags |= TCPPacket.DST
+      if type in TCPPacket.types:
+         out = [TCPPacket.header.pack(TCPPacket.version, flags, TCPPacket.types.index(type))]
+      else:
+         out = [TCPPacket.header.pack(TCPPacket.version, flags, TCPPacket.other)]
+         TCPPacket.pack(type, out)
+
+      TCPPacket.pack(attr, out)
+      if src is not None: TCPPacket.pack(src, out)
+      if dst is not None: TCPPacket.pack(dst, out)
+
+      data = ''.join(out)
+      return TCPPacket.length.pack(len(data)) + data
+
+   # Returns the message, with its logical source and destination (None if 
+   # not given). The message is read in data (str or bytearray) from offset. 
+   # Raises ValueError if it is of another version or of an unknown type.
+   @staticmethod
+   def decode(data, offset = 0):
+      version, flags, type = TCPPacket.header.unpack_from(data, offset)
+      if version != TCPPacket.version:
+         raise ValueError('Unknown TCP message version: %d' % version)
+      offset += TCPPacket.header.size
+
+      if type == TCPPacket.other:
+         type, offset = TCPPacket.unpack(data, offset)
+      elif type < len(TCPPacket.types):
+         type = TCPPacket.types[type]
+      else:
+         raise ValueError('Unknown TCP message type: %d' % type)
+      attr, offset = TCPPacket.unpack(data, offset)
+
+      src = dst = None
+      if flags & TCPPacket.SRC:
+         src, offset = TCPPacket.unpack(data, offset)
+      if flags & TCPPacket.DST:
+         dst, offset = TCPPacket.unpack(data, offset)
+      return (type, attr), src, dst
+
+   # Appends the encoding of a value to the list out.
+   @staticmethod
+   def pack(v, out):
+      if v is None:
+         out.append('N')
+      elif v is True or v is False:
+         out.append('T' if v else 'F')
+      elif isinstance(v, (int, long)):
+         if -2**31 <= v < 2**31:
+            out.append('i' + TCPPacket.int32.pack(v))
+         else:
+            out.append('q' + TCPPacket.int64.pack(v))
+      elif isinstance(v, float):
+         out.append('d' + TCPPacket.double.pack(v))
+      elif isinstance(v, basestring):
+         if isinstance(v, unicode):
+            v = v.encode('utf-8')
+         out.append('s' + TCPPacket.count.pack(len(v)) + v)
+      elif isinstance(v, (list, tuple)):
+         n = TCPPacket.count.pack(len(v))
+         # Lists of numbers are packed as arrays.
+         if v and all(type(x) in (int, long) for x in v):
+            if -2**31 <= min(v) and max(v) < 2**31:
+               out.append('I' + n + struct.pack('!%di' % len(v), *v))
+            else:
+               out.append('Q' + n + struct.pack('!%dq' % len(v), *v))
+         elif v and all(type(x) is float for x in v):
+            out.append('D' + n + struct.pack('!%dd' % len(v), *v))
+         else:
+            out.append('l' + n)
+            for x in v:
+               TCPPacket.pack(x, out)
+      else:
+         raise TypeError('Cannot encode %r in a TCP message' % (v,))
+
+   # Decodes the value at the given offset. Returns the value and the offset 
+   # of the next one.
+   @staticmethod
+   def unpack(data, offset):
+      tag = chr(data[offset]) if isinstance(data[offset], int) else data[offset]
+      offset += 1
+      if tag == 'N':
+         return None, offset
+      if tag in 'TF':
+         return tag == 'T', offset
+      if tag == 'i':
+         return TCPPacket.int32.unpack_from(data, offset)[0], offset + 4
+      if tag == 'q':
+         return TCPPacket.int64.unpack_from(data, offset)[0], offset + 8
+      if tag == 'd':
+         return TCPPacket.double.unpack_from(data, offset)[0], offset + 8
+
+      n = TCPPacket.count.unpack_from(data, offset)[0]
+      offset += TCPPacket.count.size
+      if tag == 's':
+         return str(data[offset:offset + n]), offset + n
+      if tag in 'IQD':
+         fmt = '!%d%s' % (n, {'I': 'i', 'Q': 'q', 'D': 'd'}[tag])
+         return list(struct.unpack_from(fmt, data, offset)), offset + struct.calcsize(fmt)
+      if tag == 'l':
+         v = []
+         for k in range(n):
+            x, offset = TCPPacket.unpack(data, offset)
+            v.append(x)
+         return v, offset
+      raise ValueError('Unknown tag in TCP message: %r' % tag)
+
+###############################################################################
+class TCPStream:
+
+   """
+   TCPStream reassembles the messages received on a connection. The data is 
+   received directly in a preallocated buffer, and the messages are decoded 
+   in place. The buffer is only reallocated (doubled) if a message does not 
+   fit in it.
+   """
+
+   size = 4096
+
+   def __init__(self):
+      self.buffer = bytearray(TCPStream.size)
+      self.start = 0 # Start of the first message not decoded yet.
+      self.end = 0 # End of the data received.
+
+   # Returns the free part of the buffer, in which data can be received.
+   def space(self):
+      if self.end == len(self.buffer):
+         n = self.end - self.start
+         # The buffer is full of a single message: a larger one is needed.
+         if self.start == 0:
+            buffer = bytearray(2*len(self.buffer))
+            buffer[:n] = self.buffer[:n]
+            self.buffer = buffer
+         else:
+            self.buffer[:n] = self.buffer[self.start:self.end]
+            self.start = 0
+            self.end = n
+      return memoryview(self.buffer)[self.end:]
+
+   # Records that n bytes were received in the free part of the buffer.
+   def received(self, n):
+      self.end += n
+
+   # Decodes the messages completed.
+   def messages(self):
+      size = TCPPacket.length.size
+      while self.end - self.start >= size:
+         n = TCPPacket.length.unpack_from(self.buffer, self.start)[0]
+         if self.end - self.start < size + n:
+            break
+         m = TCPPacket.decode(self.buffer, self.start + size)
+         self.start += size + n
+         yield m
+      if self.start == self.end:
+         self.start = self.end = 0
+
+###############################################################################
+class TCPServer(Thread):
+
+    """
+    TCPServer is a Thread that handles incoming out of band requests. Each 
+    peer keeps a single connection open for the whole session: a handler 
+    thread is attached to every accepted connection. The server can also be 
+    attached to a reactor instead of being started, in which case connections 
+    are read without blocking as data comes in.
+    """
+
+    port = 5000
+    max_connections = 50
+    expiration = 5
+    
+    def __init__(self, addr, q):
+       Thread.__init__(self)
+       self.reactor = None
+       self.streams = {} # Streams of the connections (reactor).
+       try:
+          self.ON = True
+          self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+          self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+          self.s.bind((addr, TCPServer.port))
+          self.s.settimeout(TCPServer.expiration)
+          self.s.listen(TCPServer.max_connections)
+          self.q = q
+       except socket.error, msg:
+          print 'Socket creation error:', msg
+          self.ON = False
+
+    def close(self):
+       self.ON = False
+       if self.reactor is not None:
+          self.reactor.remove(self.s)
+          for input in self.streams.keys():
+             self.disconnect(input)
+       self.s.close()
+            
+    def isAlive(self):
+       return self.ON
+
+    def run(self):
+       while self.ON:
+          # Each incoming connection is handled by its own thread.
+          try:
+             input, addr = self.s.accept()
+             input.settimeout(TCPServer.expiration)
+             h = Thread(target = self.handle, args = (input, addr[0]))
+             h.daemon = True
+             h.start()
+             
+          # The timeout allows to close the server properly.
+          except socket.timeout:
+             continue
+          except socket.error, msg:
+             if self.ON:
+                print 'Socket error:', msg
+             self.ON = False
+    
+    # Messages are reconstructed, decoded and put in the queue until the peer 
+    # closes the connection. A peer sending messages that cannot be decoded 
+    # (e.g. of another version) is disconnected.
+    def handle(self, input, addr):
+       stream = TCPStream()
+       try:
+          while self.ON:
+             try:
+                n = input.recv_into(stream.space())
+             except socket.timeout:
+                continue
+             if not n:
+                break
+             stream.received(n)
+             for m in stream.messages():
+                self.deliver(m, addr)
+       except socket.error:
+          pass
+       except ValueError, msg:
+          print 'Dropping connection from', addr + ':', msg
+       finally:
+          input.close()
+
+    # Puts a decoded message in the queue of its logical destination if it is 
+    # hosted in this process, or in the queue of the server otherwise. The 
+    # message is tagged with its logical source, if any.
+    def deliver(self, m, addr):
+       p, src, dst = m
+       q = TCPClient.local.get(dst, self.q)
+       if q is not None:
+          q.put((p, src or addr))
+
+    # Runs the server in the given reactor instead of its own thread.
+    def attach(self, reactor):
+       self.reactor = reactor
+       self.s.setblocking(0)
+       reactor.add(self.s, self.accept)
+
+    # Accepts a connection whose messages are read by the reactor.
+    def accept(self):
+       try:
+          input, addr = self.s.accept()
+       except socket.error, msg:
+          if msg.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+             return
+          if self.ON:
+             print 'Socket error:', msg
+          self.ON = False
+          self.reactor.stop()
+          return
+
+       input.setblocking(0)
+       self.streams[input] = TCPStream()
+       self.reactor.add(input, lambda: self.read(input, addr[0]))
+
+    # Reads the data available on a connection, and puts the messages 
+    # completed in the queue. As in handle, a peer sending messages that 
+    # cannot be decoded is disconnected.
+    def read(self, input, addr):
+       stream = self.streams[input]
+       try:
+          n = input.recv_into(stream.space())
+       except socket.error, msg:
+          if msg.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+             return
+          n = 0
+
+       # The peer closed the connection.
+       if not n:
+          self.disconnect(input)
+          return
+
+       stream.received(n)
+       try:
+          for m in stream.messages():
+             self.deliver(m, addr)
+       except ValueError, msg:
+          print 'Dropping connection from', addr + ':', msg
+          self.disconnect(input)
+
+    def disconnect(self, input):
+       self.reactor.remove(input)
+       del self.streams[input]
+       input.close()
+
+###############################################################################
+class TCPClient:
+
+   """
+   TCPClient is a class sending out of band messages. A single connection is 
+   kept open towards each peer and reused for every message, so that sending 
+   costs a single write. It is made of static methods only.
+
+   Several logical peers can be hosted by the same process: their address is 
+   'ip:name', where ip is the address of the host. Messages towards a logical 
+   address hosted in this process are put directly in its queue, and the 
+   others are sent to the host, which delivers them (see TCPServer).
+   """
+
+   connections = {}
+   locks = {} # Locks of the connections, by host.
+   local = {} # Queues of the logical addresses hosted in this process.
+   lock = Lock()
+
+   # Returns the address of the host of a (possibly logical) address.
+   @staticmethod
+   def route(addr):
+      return addr.split(':')[0]
+
+   # The source src is only needed if it is a logical address. Connecting and
+   # sending give up after timeout seconds if given: the timeout only applies 
+   # to this message, the pooled connections being blocking otherwise. Peers 
+   # are sent to concurrently, each connection having its own lock.
+   @staticmethod
+   def send(addr, payload_type, payload_attributes = None, src = None, 
+            timeout = None):
+      q = TCPClient.local.get(addr)
+      if q is not None:
+         q.put(((payload_type, payload_attributes), src))
+         return True
+
+      host = TCPClient.route(addr)
+      if src is not None and TCPClient.route(src) == src:
+         src = None
+      dst = addr if addr != host else None
+      data = TCPPacket.encode(payload_type, payload_attributes, src, dst)
+      with TCPClient.lock:
+         lock = TCPClient.locks.setdefault(host, Lock())
+      with lock:
+         # A broken connection is opened again once before giving up.
+         for attempt in range(2):
+            try:
+               s = TCPClient.connections.get(host)
+               if s is not None and TCPClient.closed(s):
+                  TCPClient.drop(host)
+                  s = None
+               if s is None:
+                  s = socket.create_connection((host, TCPServer.port), timeout)
+                  s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                  TCPClient.connections[host] = s
+               s.settimeout(timeout)
+               try:
+                  s.sendall(data)
+               finally:
+                  s.settimeout(None)
+               return True
+            except socket.error, msg:
+               TCPClient.drop(host)
+         print 'Unable to send TCP message:', msg
+         return False
+
+   # Returns True if the peer closed the connection s (e.g. it restarted): 
+   # sending on it would still succeed, but the message would be lost. Peers 
+   # never write on these connections: once readable, they are at their end.
+   @staticmethod
+   def closed(s):
+      try:
+         if not select.select([s], [], [], 0)[0]:
+            return False
+         return s.recv(1, socket.MSG_PEEK) == ''
+      except (socket.error, select.error):
+         return True
+
+   # Closes the connection towards addr, if any.
+   @staticmethod
+   def drop(addr):
+      s = TCPClient.connections.pop(addr, None)
+      if s is not None:
+         s.close()
+
+   # Closes all the connections.
+   @staticmethod
+   def close():
+      with TCPClient.lock:
+         locks = TCPClient.locks.items()
+      for host, lock in locks:
+         with lock:
+            TCPClient.drop(host)
+
+###############################################################################
+class TCPOutbox:
+
+   """
+   TCPOutbox sends messages in the background, so that the caller never waits 
+   for the network. Messages are queued per peer, and the peers are served by 
+   a pool of threads, each peer by a single thread at a time: a slow or dead 
+   peer only delays its own messages. A queued message of a coalesced type is 
+   replaced by a newer one of the same type towards the same peer, and the 
+   messages still queued after their deadline are dropped. The latency of the 
+   messages sent (from their posting) and the failures are recorded.
+   """
+
+   workers = 4
+   lifetime = 1 # Default time before the messages are dropped (s).
+   timeout = 1 # Timeout of the connections (s).
+   coalesced = ('switch',)
+
+   def __init__(self, src = None, workers = None):
+      self.ON = True
+      self.src = src
+      self.cond = Condition()
+      self.queues = {} # [payload_type, attributes, time, deadline], by peer.
+      self.ready = deque() # Peers with messages and no thread serving them.
+      self.busy = set() # Peers being served.
+
+      self.sent = 0
+      self.failed = 0
+      self.expired = 0
+      self.merged = 0 # Messages replaced by newer ones.
+      self.latency = 0
+      self.max_latency = 0
+
+      self.threads = []
+      for i in range(workers or TCPOutbox.workers):
+         t = Thread(target = self.work)
+         t.daemon = True
+         t.start()
+         self.threads.append(t)
+
+   # Sends the remaining messages (unless expired) and stops the threads.
+   def close(self):
+      with self.cond:
+         self.ON = False
+         self.cond.notify_all()
+      for t in self.threads:
+         t.join()
+
+   # Queues a message towards addr, dropped if not sent within lifetime 
+   # seconds (TCPOutbox.lifetime by default).
+   def post(self, addr, payload_type, payload_attributes = None, lifetime = None):
+      t = time.time()
+      deadline = t + (lifetime if lifetime is not None else TCPOutbox.lifetime)
+      with self.cond:
+         q = self.queues.setdefault(addr, deque())
+         if payload_type in TCPOutbox.coalesced:
+            for m in q:
+               if m[0] == payload_type:
+                  m[1:] = [payload_attributes, t, deadline]
+                  self.merged += 1
+                  return
+         q.append([payload_type, payload_attributes, t, deadline])
+         if len(q) == 1 and addr not in self.busy:
+            self.ready.append(addr)
+            self.cond.notify()
+
+   # Loop of the threads: the messages of a peer are taken all at once.
+   def work(self):
+      while True:
+         with self.cond:
+            while self.ON and not self.ready:
+               self.cond.wait()
+            if not self.ready:
+               return
+            addr = self.ready.popleft()
+            self.busy.add(addr)
+            msgs = self.queues.pop(addr)
+
+         for m in msgs:
+            self.deliver(addr, m)
+
+         with self.cond:
+            self.busy.discard(addr)
+            if self.queues.get(addr):
+               self.ready.append(addr)
+               self.cond.notify()
+
+   def deliver(self, addr, m):
+      if time.time() > m[3]:
+         with self.cond:
+            self.expired += 1
+         return
+
+      ok = TCPClient.send(addr, m[0], m[1], self.src, TCPOutbox.timeout)
+      latency = time.time() - m[2]
+      with self.cond:
+         if ok:
+            self.sent += 1
+            self.latency += latency
+            self.max_latency = max(self.max_latency, latency)
+         else:
+            self.failed += 1
+
+   # Returns the numbers of messages sent, failed, expired and coalesced, and
+   # the mean and max latency of the messages sent (s).
+   def stats(self):
+      with self.cond:
+         mean = self.latency/self.sent if self.sent else 0
+         return (self.sent, self.failed, self.expired, self.merged, mean, 
+                 self.max_latency)
+###############################################################################
+class TCPMailbox:
+
+   """
+   TCPMailbox replaces the shared queue of incoming messages. Messages are 
+   routed into a slot per (source, payload_type), each with its own condition, 
+   so that waiting for a specific message does not require to scan the others. 
+   It offers the put method of a queue, so that TCPServers can fill it.
+   """
+
+   def __init__(self):
+      self.lock = Lock()
+      self.slots = {} # source -> payload_type -> [condition, messages]
+      self.pending = set() # Sources which may have messages queued.
+      self.n = 0 # Arrival order of the messages.
+
+   # Returns the slot of (addr, payload_type), created on demand.
+   def slot(self, addr, payload_type):
+      slots = self.slots.setdefault(addr, {})
+      s = slots.get(payload_type)
+      if s is None:
+         s = slots[payload_type] = [Condition(self.lock), deque()]
+      return s
+
+   def put(self, item):
+      p, addr = item
+      with self.lock:
+         s = self.slot(addr, p[0])
+         s[1].append((self.n, p))
+         self.pending.add(addr)
+         self.n += 1
+         s[0].notify()
+
+   # Waits for a message of payload_type from addr and returns its payload. 
+   # Raises Queue.Empty if nothing arrived within the timeout.
+   def get(self, addr, payload_type, timeout = None):
+      with self.lock:
+         s = self.slot(addr, payload_type)
+         if not s[1]:
+            s[0].wait(timeout)
+            if not s[1]:
+               raise Queue.Empty()
+         return s[1].popleft()[1]
+
+   # Removes and returns all the pending messages (payload, addr) coming from 
+   # the given addresses, restricted to the given payload types if any. 
+   # Messages are returned in their arrival order. Only the sources which 
+   # have messages are looked at when they are fewer than the addresses, 
+   # which should then be a set or a dict.
+   def drain(self, addrs, payload_types = None):
+      msgs = []
+      with self.lock:
+         if len(self.pending) < len(addrs):
+            addrs = [addr for addr in self.pending if addr in addrs]
+         for addr in addrs:
+            slots = self.slots.get(addr)
+            if not slots:
+               continue
+            for payload_type in (payload_types or slots.keys()):
+               s = slots.get(payload_type)
+               if s and s[1]:
+                  msgs.extend((n, p, addr) for n, p in s[1])
+                  s[1].clear()
+            if not any(s[1] for s in slots.itervalues()):
+               self.pending.discard(addr)
+      msgs.sort()
+      return [(p, addr) for n, p, addr in msgs]
\ No newline at end of file
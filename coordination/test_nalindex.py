@@ -0,0 +1,96 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the tests of the NAL unit index of raw H.264 streams, on
+generated streams. Run from this directory with: python -m unittest discover
+"""
+
+import os
+import random
+import tempfile
+import unittest
+import nalindex
+from nalindex import NALIndex, NALVideo
+
+# Returns a raw stream made of the given units (type, payload), with 3 and
+# 4-byte start codes, and the expected (offset, size, type) of each unit.
+def stream(r, units):
+   data = ''
+   expected = []
+   for type, payload in units:
+      data += '\x00' * r.randint(0, 1) + '\x00\x00\x01'
+      expected.append((len(data), 1 + len(payload), type))
+      data += chr(0x60 | type) + payload
+   return data, expected
+
+###############################################################################
+class TestNALIndex(unittest.TestCase):
+
+   """
+   Units are found both with NumPy (if available) and with mmap.find.
+   """
+
+   def setUp(self):
+      self.random = random.Random(42)
+      self.paths = []
+
+   def tearDown(self):
+      for path in self.paths:
+         os.remove(path)
+
+   def write(self, data):
+      fd, path = tempfile.mkstemp('.h264')
+      os.write(fd, data)
+      os.close(fd)
+      self.paths.append(path)
+      return path
+
+   # Random payloads, which may contain zero bytes but no start code, and
+   # never end with a zero byte.
+   def units(self, n):
+      units = []
+      for k in range(n):
+         payload = ''.join(self.random.choice('\x00\x02\xff') for i in range(self.random.randint(0, 20)))
+         payload = payload.replace('\x00\x00', '\x00\x03') + '\x80'
+         units.append((self.random.choice((1, 5, 6, 7, 8)), payload))
+      return units
+
+   def index(self, path, scan):
+      numpy = nalindex.numpy
+      if not scan:
+         nalindex.numpy = None
+      try:
+         index = NALIndex(path)
+      finally:
+         nalindex.numpy = numpy
+      found = zip([int(s) for s in index.start], [int(s) for s in index.size],
+                  [int(t) for t in index.type])
+      index.close()
+      return found
+
+   def test_units(self):
+      for trial in range(20):
+         data, expected = stream(self.random, self.units(self.random.randint(1, 30)))
+         path = self.write(data)
+         self.assertEqual(self.index(path, False), expected)
+         if nalindex.numpy is not None:
+            self.assertEqual(self.index(path, True), expected)
+
+   # The zero byte of a 4-byte start code is not part of the previous unit.
+   def test_zero_byte(self):
+      path = self.write('\x00\x00\x00\x01\x67\x42\x00\x00\x00\x01\x65\x88')
+      self.assertEqual(self.index(path, False), [(4, 2, 7), (10, 2, 5)])
+
+   def test_video(self):
+      vbr, expected = stream(self.random, [(7, 'a'), (8, 'b'), (5, 'cc'), (1, 'd'), (6, 'e'), (1, 'ff')])
+      cbr = stream(self.random, [(5, 'x'), (1, 'y')])[0]
+      video = NALVideo(self.write(vbr), self.write(cbr))
+      self.assertEqual(len(video), 2)
+      self.assertEqual(video.units(0), [e[:2] for e in expected[:3]])
+      self.assertEqual(video.units(1), [e[:2] for e in expected[3:4]])
+      self.assertEqual(video.tracks(), [[(5, 3), (1, 2)], [(5, 2), (1, 2)]])
+      video.close()
+
+if __name__ == '__main__':
+   unittest.main()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the tests of the schedules of the videos, and of their
+cache. Run from this directory with: python -m unittest discover
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from schedule import Schedule
+from cache import ScheduleCache
+
+# Returns the schedule of a random video of n frames, with GOPs of random
+# lengths.
+def random_schedule(r, n):
+   types = [5 if j == 0 or r.random() < 0.1 else 1 for j in range(n)]
+   vbr = [r.uniform(1, 100) for j in range(n)]
+   cbr = [r.uniform(1, 50) for j in range(n)]
+   return Schedule(types, vbr, cbr)
+
+###############################################################################
+class TestSchedule(unittest.TestCase):
+
+   """
+   The precomputed arrays of a schedule are checked against sums over the
+   frames, and the schedule is written and read back.
+   """
+
+   def setUp(self):
+      self.random = random.Random(42)
+
+   def test_sums(self):
+      for n in (0, 1, 2, 50):
+         s = random_schedule(self.random, n)
+         gops = [j for j in range(n) if s.type[j] == Schedule.IDR] + [n]
+         peak = [0., 0.]
+         for k in range(len(gops) - 1):
+            for cbr, sizes in ((0, s.vbr), (1, s.cbr)):
+               peak[cbr] = max(peak[cbr], sum(sizes[gops[k]:gops[k + 1]]))
+            for j in range(gops[k], gops[k + 1]):
+               self.assertEqual(s.nextGOP(j), gops[k + 1] - j)
+         self.assertAlmostEqual(s.peak[0], peak[0])
+         self.assertAlmostEqual(s.peak[1], peak[1])
+         if n:
+            self.assertAlmostEqual(s.mean[0], sum(s.vbr)/n)
+            self.assertAlmostEqual(s.rate(30, True), 30*sum(s.cbr)/n)
+         for i in range(n + 1):
+            for j in range(i, n + 1):
+               self.assertAlmostEqual(s.total(i, j), sum(s.vbr[i:j]))
+               self.assertAlmostEqual(s.total(i, j, True), sum(s.cbr[i:j]))
+
+   def test_write_read(self):
+      for n in (0, 1, 100):
+         s = random_schedule(self.random, n)
+         f = tempfile.TemporaryFile()
+         s.write(f)
+         f.seek(0)
+         t = Schedule.read(f)
+         f.close()
+         for a in ('type', 'vbr', 'cbr', 'gop', 'vbr_sum', 'cbr_sum', 'mean', 'peak'):
+            self.assertEqual(getattr(t, a), getattr(s, a))
+
+   def test_read_invalid(self):
+      f = tempfile.TemporaryFile()
+      random_schedule(self.random, 10).write(f)
+      f.seek(0)
+      data = f.read()
+      f.close()
+      for bad in (data[:Schedule.header.size - 1], data[:-1], 'x' + data[1:]):
+         f = tempfile.TemporaryFile()
+         f.write(bad)
+         f.seek(0)
+         self.assertRaises(ValueError, Schedule.read, f)
+         f.close()
+
+###############################################################################
+class TestScheduleCache(unittest.TestCase):
+
+   """
+   Schedules are cached by the content of the files they are parsed from.
+   """
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.cache = ScheduleCache(os.path.join(self.directory, 'cache'))
+      self.calls = 0
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def file(self, name, data):
+      path = os.path.join(self.directory, name)
+      f = open(path, 'wb')
+      f.write(data)
+      f.close()
+      return path
+
+   def loader(self, *paths):
+      self.calls += 1
+      return random_schedule(random.Random(len(paths)), 20)
+
+   def test_key(self):
+      a = self.file('a', 'abc')
+      b = self.file('b', 'abc')
+      c = self.file('c', 'abd')
+      d = self.file('d', 'ab')
+      e = self.file('e', 'cabc')
+      key = self.cache.key
+      self.assertEqual(key(a), key(b))
+      self.assertNotEqual(key(a), key(c))
+      self.assertNotEqual(key(a, b), key(b))
+      self.assertNotEqual(key(a, c), key(c, a))
+      # The content of the files is not simply concatenated.
+      self.assertNotEqual(key(a, e), key(d, self.file('f', 'ccabc')))
+
+   def test_load(self):
+      a = self.file('a', 'abc')
+      s = self.cache.load(self.loader, a)
+      t = self.cache.load(self.loader, self.file('b', 'abc'))
+      self.assertEqual(self.calls, 1)
+      self.assertEqual(t.vbr, s.vbr)
+      self.cache.load(self.loader, self.file('a', 'abd'))
+      self.assertEqual(self.calls, 2)
+
+   # A missing file is given to the loader, which reports it.
+   def test_missing(self):
+      self.assertEqual(self.cache.load(lambda path: None,
+                                       os.path.join(self.directory, 'x')), None)
+
+if __name__ == '__main__':
+   unittest.main()
\ No newline at end of file
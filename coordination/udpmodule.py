@@ -1,200 +1,616 @@
-""" 
-Author: Cedric Bonhomme
-Date: 26-07-2015
-
-This file contains the implementation of the UDP module, used in senders 
-(UDPClient) and listeners (UDPServer).
-UDPClients send UDPPackets to UDPServers at a given rate, while those 
-servers keep tracks on various statistics about their incoming streams.
-"""
-
-import time
-import socket
-from threading import Thread
-
-###############################################################################
-class UDPPacket:
-
-   """
-   UDPPacket is the data structure representing UDP packets. The max payload 
-   size is fixed to 1250 bytes (10kb) to ease the measurement. The separation 
-   between header and payload allows to measure the goodput only. Each packet 
-   has a timestamp, in order to track losses. It contains only two static 
-   methods: encode and decode.
-   """
-
-   payload_size = 1250
-   timestamp_size = 10
-   header_size = timestamp_size + 2 # Minimum RTP header size.
-   tot_size = header_size + payload_size
-
-   header = 'a' * (header_size - timestamp_size)
-   
-   @staticmethod
-   def decode(data):
-      return int(data[0:10]), float(len(data) - UDPPacket.header_size)/125
-   @staticmethod
-   def encode(timestamp, payload_size):
-      return ('%010d' % (timestamp%10000000000)) + UDPPacket.header + 'b' * payload_size
-      
-###############################################################################
-class UDPFlow:
-
-   """
-   UDPFlow is a data structure used by UDPServers to keep tracks of incoming 
-   UDP streams and to compute statistics about them.   
-   """
-   
-   dt = 1
-   # There must be only one stream per source.
-   def __init__(self, src):
-      self.src = src
-      self.miss = [] # List of missing (delayed or lost) packets.
-      self.N = [] # Array of arrived packets.
-      self.N.append(0)
-      self.current = (0,0) # Timestamp and arrival time of the last packet.
-
-   def add(self, data, t):
-      timestamp, size = UDPPacket.decode(data)
-      # The initial time is taken at the arrival of the first packet.
-      if self.N[0] == 0:
-         self.t_init = t
-
-      # Arrival time is relative to t_init.
-      self.dt = t - self.t_init
-      
-      # Each packet arrives in a specific time interval of size dt.
-      if self.dt < len(self.N) * UDPFlow.dt:
-         self.N[len(self.N) - 1] += size
-      else:
-         self.N.append(size)
-
-      # The incoming packet is delayed.
-      if timestamp < self.current[0]:
-         for p in self.miss:
-            if p[0] == timestamp:
-               self.miss.remove(p)
-      
-      # The incoming packet is not delayed, but prior packets may be missing.
-      elif timestamp > self.current[0]:
-         for i in range(self.current[0] + 1, timestamp):
-            self.miss.append((i,self.current[1]))
-         self.current = (timestamp, self.dt)
-
-   # Returns the (rho, sigma) parameters based on the stream's statistics.
-   def log(self):
-      return (self.N,self.miss)
-###############################################################################
-class UDPServer(Thread):
-
-   """
-   UDPServer is a thread handling incoming UDPPackets. If packets belong to an 
-   existing flow, they are added to it, or discarded otherwise.
-   """
-   
-   port = 6000
-   expiration = 5
-   
-   def __init__(self, addr):
-      Thread.__init__(self)
-      try:
-         self.ON = True
-         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-         self.s.bind((addr, UDPServer.port))
-         self.s.settimeout(UDPServer.expiration)
-         self.flowHandler = []
-
-      except socket.error, msg:
-         print 'Socket creation error:', msg
-         self.ON = False      
-      
-   def close(self):
-      self.ON = False
-      self.s.close()
-
-   def isAlive(self):
-      return self.ON
-   # Finds a flow based on an IP address.
-   def find(self, src):
-      for i in range(len(self.flowHandler)):
-         if self.flowHandler[i].src == src:
-            return i
-      return -1
-
-   # Adds a flow to the flow handler.
-   def addFlow(self, src):
-      self.flowHandler.append(UDPFlow(src))
-
-   # Removes a flow from the flow handler and returns (rho,sigma).
-   def delFlow(self, src):
-      f = self.find(src)
-      if f == -1: 
-         return ''
-      stats = self.flowHandler[f].log()
-      self.flowHandler.pop(f)
-      return stats
-
-   # Infinite loop handling incoming packets.
-   def run(self):
-      while self.ON:
-         try:
-            d = self.s.recvfrom(UDPPacket.tot_size) # Blocking operation.
-            t = time.time()
-            f = self.find(d[1][0])
-            if d[0] and f != -1:
-               self.flowHandler[f].add(d[0], t)
-         # The timeout allows for closing the server properly.
-         except socket.timeout:
-            continue
-         except socket.error, msg:
-            print 'Socket error:', msg
-            self.ON = False 
-
-###############################################################################
-class UDPClient:
-
-   """
-   UDPClient is the class streaming UDPPackets towards a single UDPServer, 
-   based on the size of the frame to send.
-   """
-   
-   def __init__(self, addr):
-      try:
-         self.ON = True
-         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-         self.dest = (addr, UDPServer.port)
-         self.timestamp = 0
-      except socket.error, msg:
-         print 'Socket creation error:', msg
-         self.ON = False
-
-   def close(self):
-      self.ON = False
-      self.s.close()
-      
-   def isAlive(self):
-      return self.ON
- 
-   def send(self, frame_size):
-      
-      if not self.ON:
-         return
-      
-      # S = N*UDPPacket.payload_size + M bytes
-      S = int(125*frame_size)
-      N = S / UDPPacket.payload_size
-      M = S % UDPPacket.payload_size
-
-      try:
-         
-         for i in range(N):
-            self.s.sendto(UDPPacket.encode(self.timestamp, UDPPacket.payload_size), self.dest)
-            self.timestamp += 1
-            
-         if M != 0:
-            self.s.sendto(UDPPacket.encode(self.timestamp, M), self.dest)
-            self.timestamp += 1
-
-      except socket.error, msg:
-         print 'Unable to send the UDP stream:', msg
+""" 
+Author: Cedric Bonhomme
+Date: 26-07-2015
+
+This file contains the implementation of the UDP module, used in senders 
+(UDPClient) and listeners (UDPServer).
+UDPClients send UDPPackets to UDPServers at a given rate, while those 
+servers keep tracks on various statistics about their incoming streams.
+"""
+
+import time
+import errno
+import fcntl
+import socket
+import struct
+from threading import Thread
+from arrivals import ArrivalTrace
+from pacer import Pacer
+from nalindex import NALIndex
+
+# Kernel reception timestamps: SIOCGSTAMPNS returns the arrival time of the 
+# last datagram received by a socket, as a timespec.
+SIOCGSTAMPNS = 0x8907
+timespec = struct.Struct('@ll')
+
+###############################################################################
+class UDPPacket:
+
+   """
+   UDPPacket is the data structure representing UDP packets. The max payload 
+   size is fixed to 1250 bytes (10kb) to ease the measurement. The separation 
+   between header and payload allows to measure the goodput only. Each packet 
+   has a timestamp, in order to track losses, and the identifier of its flow. 
+   It contains only two static methods: encode and decode.
+   """
+
+   payload_size = 1250
+   timestamp_size = 10
+   header_size = timestamp_size + 2 # Minimum RTP header size.
+   tot_size = header_size + payload_size
+
+   # The flow identifier is packed in the last 2 bytes of the header.
+   flow = struct.Struct('!H')
+   
+   @staticmethod
+   def decode(data):
+      return int(data[0:10]), float(len(data) - UDPPacket.header_size)/125, \
+             UDPPacket.flow.unpack_from(data, UDPPacket.timestamp_size)[0]
+   @staticmethod
+   def encode(timestamp, payload_size, flow = 0):
+      return ('%010d' % (timestamp%10000000000)) + UDPPacket.flow.pack(flow) + 'b' * payload_size
+
+###############################################################################
+class UDPPacketizer:
+
+   """
+   UDPPacketizer cuts frames into UDPPackets held in a preallocated buffer. 
+   Payloads and flow identifiers are written once: for each frame, only the 
+   timestamps are written in place, and the packets are sent from views on 
+   the buffer, the last one (tail) being a shorter view on its slot. The 
+   buffer grows, by doubling, when a frame needs more packets. The packets of 
+   a frame can be spread over an interval instead of being sent at once.
+   """
+
+   def __init__(self, flow = 0, n = 16):
+      self.flow = flow
+      self.alloc(n)
+
+   # Allocates the buffer for n packets.
+   def alloc(self, n):
+      self.n = n
+      self.buf = bytearray(UDPPacket.encode(0, UDPPacket.payload_size, self.flow) * n)
+      view = memoryview(self.buf)
+      self.slots = [view[i*UDPPacket.tot_size:(i+1)*UDPPacket.tot_size] 
+                    for i in range(n)]
+
+   # Sends N full packets and a tail of M bytes (none if 0) with consecutive
+   # timestamps, evenly spread over interval seconds if given. Returns the 
+   # next timestamp.
+   def send(self, s, addr, timestamp, N, M, interval = 0):
+      K = N + (M != 0)
+      if K > self.n:
+         n = self.n
+         while n < K:
+            n *= 2
+         self.alloc(n)
+
+      buf = self.buf
+      size = UDPPacket.tot_size
+      for i in range(K):
+         o = i*size
+         buf[o:o + UDPPacket.timestamp_size] = '%010d' % ((timestamp + i)%10000000000)
+
+      packets = self.slots[:N]
+      if M != 0:
+         packets.append(self.slots[N][:UDPPacket.header_size + M])
+
+      sendto = s.sendto
+      if interval and K > 1:
+         pacer = Pacer(float(interval)/K)
+         for p in packets:
+            pacer.wait()
+            sendto(p, addr)
+      else:
+         for p in packets:
+            sendto(p, addr)
+      return timestamp + K
+      
+###############################################################################
+class UDPFragmenter:
+
+   """
+   UDPFragmenter sends NAL units in UDPPackets, as RTP does (RFC 6184): a unit 
+   fitting in a payload is sent alone, and a larger one is fragmented into 
+   FU-A packets. Their payload starts with a FU indicator (F and NRI bits of 
+   the unit, type 28) and a FU header (start and end bits, type of the unit), 
+   followed by a fragment of the unit without its first byte. Packets are 
+   written in a single preallocated buffer, into which the units are copied 
+   straight from their memory-mapped stream.
+   """
+
+   FU_A = 28
+   START = 0x80
+   END = 0x40
+
+   def __init__(self, flow = 0):
+      self.buf = bytearray(UDPPacket.encode(0, UDPPacket.payload_size, flow))
+      self.view = memoryview(self.buf)
+
+   # Returns the number of packets of a unit of size bytes.
+   @staticmethod
+   def count(size):
+      if size <= UDPPacket.payload_size:
+         return 1
+      n = UDPPacket.payload_size - 2
+      return (size - 1 + n - 1) / n
+
+   # Sends the units (offset, size) of data with consecutive timestamps, 
+   # evenly spread over interval seconds if given. Returns the next timestamp.
+   def send(self, s, addr, timestamp, data, units, interval = 0):
+      pacer = None
+      if interval:
+         K = sum(UDPFragmenter.count(size) for offset, size in units)
+         if K > 1:
+            pacer = Pacer(float(interval)/K)
+
+      buf = self.buf
+      h = UDPPacket.header_size
+      n = UDPPacket.payload_size - 2
+      for offset, size in units:
+         if size <= UDPPacket.payload_size:
+            buf[h:h + size] = buffer(data, offset, size)
+            timestamp = self.packet(s, addr, timestamp, h + size, pacer)
+            continue
+
+         nal = ord(data[offset])
+         buf[h] = (nal & 0xE0) | UDPFragmenter.FU_A
+         k = 1
+         while k < size:
+            m = min(n, size - k)
+            fu = nal & 0x1F
+            if k == 1:
+               fu |= UDPFragmenter.START
+            if k + m == size:
+               fu |= UDPFragmenter.END
+            buf[h + 1] = fu
+            buf[h + 2:h + 2 + m] = buffer(data, offset + k, m)
+            timestamp = self.packet(s, addr, timestamp, h + 2 + m, pacer)
+            k += m
+      return timestamp
+
+   # Sends the first length bytes of the buffer with the given timestamp.
+   def packet(self, s, addr, timestamp, length, pacer):
+      self.buf[0:UDPPacket.timestamp_size] = '%010d' % (timestamp%10000000000)
+      if pacer is not None:
+         pacer.wait()
+      s.sendto(self.view[:length], addr)
+      return timestamp + 1
+
+###############################################################################
+class UDPUnits:
+
+   """
+   UDPUnits reassembles the NAL units received by a flow (see UDPFragmenter), 
+   to count those which can be decoded: a unit sent alone is complete, and a 
+   fragmented one if all its fragments arrived in order. Units are counted 
+   once their last packet arrived; units entirely lost are not seen, hence 
+   they are found from the number of units sent.
+   """
+
+   def __init__(self):
+      self.complete = 0
+      self.frames = 0 # Complete VCL units.
+      self.broken = 0
+      self.fu = None # [type, next timestamp, intact] of the fragmented unit.
+
+   def add(self, timestamp, data):
+      h = UDPPacket.header_size
+      if len(data) <= h:
+         return
+      t = ord(data[h]) & 0x1F
+      if t != UDPFragmenter.FU_A:
+         self.interrupt()
+         self.done(t, True)
+         return
+      if len(data) < h + 2:
+         return
+
+      fu = ord(data[h + 1])
+      if fu & UDPFragmenter.START:
+         self.interrupt()
+         self.fu = [fu & 0x1F, timestamp + 1, True]
+      # The first fragment was lost.
+      elif self.fu is None:
+         self.fu = [fu & 0x1F, timestamp + 1, False]
+      else:
+         if timestamp != self.fu[1]:
+            self.fu[2] = False
+         self.fu[1] = timestamp + 1
+
+      if fu & UDPFragmenter.END:
+         self.done(self.fu[0], self.fu[2])
+         self.fu = None
+
+   # A fragmented unit left unfinished is broken.
+   def interrupt(self):
+      if self.fu is not None:
+         self.done(self.fu[0], False)
+         self.fu = None
+
+   def done(self, type, intact):
+      if not intact:
+         self.broken += 1
+      else:
+         self.complete += 1
+         if type in NALIndex.VCL:
+            self.frames += 1
+
+###############################################################################
+class UDPWindow:
+
+   """
+   UDPWindow keeps track of the sequence numbers received by a flow, in a 
+   sliding window covering the last 'size' numbers. Each arrival, either in 
+   order, late or duplicated, is handled in constant (amortized) time. Packets 
+   still missing when they leave the window are considered lost for good.
+   """
+
+   size = 1 << 16
+
+   def __init__(self):
+      self.seen = bytearray(UDPWindow.size) # Reception flags, seq % size.
+      self.seen[0] = 1
+      self.current = 0 # Highest sequence number received.
+      self.received = 1 # Number of sequence numbers received.
+      self.first = 1 # Lowest sequence number not received yet.
+      self.settled = False # True if the first missing packet left the window.
+
+   # Records the arrival of sequence number n. Returns the number of packets 
+   # found missing because of this arrival, or -1 if a missing packet arrived.
+   def add(self, n):
+      W = UDPWindow.size
+
+      # The incoming packet is not delayed, but prior packets may be missing.
+      if n > self.current:
+         # Flags of the numbers leaving the window are overwritten: the first 
+         # missing number is then known for good.
+         self.advance()
+         if self.first <= n - W:
+            self.settled = True
+
+         # Clearing the flags of the numbers entering the window.
+         c = min(n - self.current, W)
+         i = (self.current + 1) % W
+         if i + c <= W:
+            self.seen[i:i + c] = bytearray(c)
+         else:
+            self.seen[i:] = bytearray(W - i)
+            self.seen[:i + c - W] = bytearray(i + c - W)
+
+         missing = n - self.current - 1
+         self.current = n
+         self.seen[n % W] = 1
+         self.received += 1
+         self.advance()
+         return missing
+
+      # The incoming packet is delayed, or duplicated, or out of the window.
+      if n <= self.current - W or self.seen[n % W]:
+         return 0
+      self.seen[n % W] = 1
+      self.received += 1
+      self.advance()
+      return -1
+
+   # Moves the first missing number forward, past the received ones.
+   def advance(self):
+      while not self.settled and self.first <= self.current and \
+            self.seen[self.first % UDPWindow.size]:
+         self.first += 1
+
+   # Returns the number of packets missing so far.
+   def missing(self):
+      return self.current + 1 - self.received
+
+   # Returns the lowest missing sequence number, -1 if none is missing.
+   def first_missing(self):
+      if self.first <= self.current:
+         return self.first
+      return -1
+
+###############################################################################
+class UDPFlow:
+
+   """
+   UDPFlow is a data structure used by UDPServers to keep tracks of incoming 
+   UDP streams and to compute statistics about them. Running totals are also 
+   kept, from which reports on the last interval are made during the stream. 
+   The memory of a flow does not depend on the length of the stream: only the 
+   last packets are retained in its trace, and the missing ones are tracked 
+   by a sliding window.
+   """
+
+   retention = 1 << 16 # Number of packets retained in the trace.
+
+   # Lengths of the intervals of the arrival curve (s), from 1 ms to 1 s.
+   taus = [0.001 * 2**k for k in range(11)]
+   
+   # A stream is identified by its source and a flow identifier. The clock 
+   # tells where its arrival times come from. The NAL units of the stream are 
+   # reassembled if it carries some.
+   def __init__(self, src, flow = 0, clock = 'user', nal = False):
+      self.src = src
+      self.flow = flow
+      self.clock = clock
+      self.window = UDPWindow() # Missing (delayed or lost) packets.
+      self.trace = ArrivalTrace(UDPFlow.retention) # Arrived packets.
+      self.units = UDPUnits() if nal else None
+
+      # Running totals: packets found missing and packets arrived late, with 
+      # the time of the first loss (s, from the first arrival).
+      self.losses = 0
+      self.late = 0
+      self.first_loss = -1
+
+      # Rate of each second of the stream (kbps): minimum, maximum and sum 
+      # over the seconds completed.
+      self.second = 0 # Current second, from the first arrival.
+      self.second_bytes = 0
+      self.seconds = 0
+      self.min_rate = None
+      self.max_rate = 0
+      self.sum_rate = 0
+
+      # Totals at the time of the last report (or of the creation).
+      self.last = (time.time(), 0, self.window.received, 0, 0)
+
+   # The size of the packet is given in kb.
+   def add(self, timestamp, size, t):
+      b = int(round(125*size))
+      self.trace.add(timestamp, t, b)
+
+      # The rate of a second is known once a packet arrives after it.
+      k = int(t - self.trace.t_init)
+      if k > self.second:
+         self.sample(self.second_bytes/125.)
+         # Seconds without any arrival have a null rate.
+         if k > self.second + 1:
+            self.seconds += k - self.second - 1
+            self.min_rate = 0
+         self.second = k
+         self.second_bytes = 0
+      self.second_bytes += b
+
+      # Delayed and missing packets are tracked by the window.
+      missing = self.window.add(timestamp)
+      if missing == -1:
+         self.late += 1
+      elif missing > 0:
+         self.losses += missing
+         if self.first_loss == -1:
+            self.first_loss = t - self.trace.t_init
+
+   # Returns the statistics of the stream since the last report: the flow 
+   # identifier, the length of the interval (s), the goodput (kbps), the 
+   # numbers of packets received, found missing, and arrived late, and the 
+   # time of the first loss of the stream (-1 if none).
+   def report(self, t):
+      totals = (t, self.trace.bytes, self.window.received, self.losses, self.late)
+      last, self.last = self.last, totals
+      dt = totals[0] - last[0]
+      goodput = (totals[1] - last[1]) / (125. * dt) if dt > 0 else 0
+      return [self.flow, dt, int(goodput)] + \
+             [totals[k] - last[k] for k in range(2, 5)] + [self.first_loss]
+
+   # Records the rate of a second.
+   def sample(self, rate):
+      self.seconds += 1
+      self.sum_rate += rate
+      self.max_rate = max(self.max_rate, rate)
+      if self.min_rate is None or rate < self.min_rate:
+         self.min_rate = rate
+
+   # Returns the statistics of the stream: its mean rate, the number of 
+   # missing packets, the clock of the arrival times, the smallest sigma of a 
+   # token bucket of the mean rate containing the arrivals retained, the 
+   # minimum, maximum and mean rates of the seconds of the stream, and the 
+   # arrival curve of the packets retained over UDPFlow.taus. The numbers of 
+   # NAL units complete, of frames complete and of units broken follow, if 
+   # the stream carries NAL units.
+   def log(self):
+      rho = self.trace.rate()
+      if self.seconds:
+         rates = (self.min_rate, self.max_rate, self.sum_rate/self.seconds)
+      else:
+         rates = (rho, rho, rho)
+      log = (rho, self.window.missing(), self.clock, self.trace.envelope(rho)) + rates
+      log += (self.trace.arrival_curve(UDPFlow.taus),)
+      if self.units is not None:
+         self.units.interrupt()
+         log += (self.units.complete, self.units.frames, self.units.broken)
+      return log
+###############################################################################
+class UDPServer(Thread):
+
+   """
+   UDPServer is a thread handling incoming UDPPackets. If packets belong to an 
+   existing flow, they are added to it, or discarded otherwise. Flows are 
+   indexed by (source, flow identifier), hence several flows can come from the 
+   same source.
+   """
+   
+   port = 6000
+
+   # Source of the arrival times: 'kernel' (reception timestamps, if supported 
+   # by the system) or 'user' (time at which recvfrom returns).
+   clock = 'kernel'
+   expiration = 5
+   
+   def __init__(self, addr):
+      Thread.__init__(self)
+      self.reactor = None
+      try:
+         self.ON = True
+         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+         self.s.bind((addr, UDPServer.port))
+         self.s.settimeout(UDPServer.expiration)
+         self.flowHandler = {}
+         self.clock = UDPServer.clock
+         if self.clock == 'kernel':
+            self.clock = self.timestamps()
+
+      except socket.error, msg:
+         print 'Socket creation error:', msg
+         self.ON = False      
+      
+   def close(self):
+      self.ON = False
+      if self.reactor is not None:
+         self.reactor.remove(self.s)
+      self.s.close()
+
+   def isAlive(self):
+      return self.ON
+   # Enables the kernel reception timestamps of the socket: the first request 
+   # turns them on. Returns the clock used, 'user' if they are not supported.
+   def timestamps(self):
+      try:
+         fcntl.ioctl(self.s.fileno(), SIOCGSTAMPNS, timespec.pack(0, 0))
+      except IOError, e:
+         # No datagram has been stamped yet.
+         if e.errno != errno.ENOENT:
+            return 'user'
+      return 'kernel'
+
+   # Receives a datagram and returns it with its arrival time.
+   def recv(self):
+      data, addr = self.s.recvfrom(UDPPacket.tot_size) # Blocking operation.
+      if self.clock == 'kernel':
+         try:
+            sec, nsec = timespec.unpack(fcntl.ioctl(self.s.fileno(), SIOCGSTAMPNS, timespec.pack(0, 0)))
+            return data, addr, sec + nsec*1e-9
+         except IOError:
+            pass
+      return data, addr, time.time()
+
+   # Finds a flow based on an IP address and a flow identifier.
+   def find(self, src, flow = 0):
+      return self.flowHandler.get((src, flow))
+
+   # Adds a flow to the flow handler.
+   def addFlow(self, src, flow = 0, nal = False):
+      self.flowHandler[(src, flow)] = UDPFlow(src, flow, self.clock, nal)
+
+   # Removes a flow from the flow handler and returns its statistics.
+   def delFlow(self, src, flow = 0):
+      f = self.flowHandler.pop((src, flow), None)
+      if f is None: 
+         return ''
+      return f.log()
+
+   # Handles an incoming packet: it is added to its flow, if any.
+   def handle(self):
+      d = self.recv()
+      if len(d[0]) < UDPPacket.header_size:
+         return
+      timestamp, size, flow = UDPPacket.decode(d[0])
+      f = self.flowHandler.get((d[1][0], flow))
+      if f is not None:
+         f.add(timestamp, size, d[2])
+         if f.units is not None:
+            f.units.add(timestamp, d[0])
+
+   # Infinite loop handling incoming packets.
+   def run(self):
+      while self.ON:
+         try:
+            self.handle()
+         # The timeout allows for closing the server properly.
+         except socket.timeout:
+            continue
+         except socket.error, msg:
+            print 'Socket error:', msg
+            self.ON = False 
+
+   # Runs the server in the given reactor instead of its own thread.
+   def attach(self, reactor):
+      self.reactor = reactor
+      self.s.setblocking(0)
+      reactor.add(self.s, self.ready)
+
+   # Handles the packets waiting in the socket (reactor).
+   def ready(self):
+      try:
+         while self.ON:
+            self.handle()
+      except socket.error, msg:
+         if msg.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+            return
+         print 'Socket error:', msg
+         self.ON = False
+         self.reactor.stop()
+
+###############################################################################
+class UDPClient:
+
+   """
+   UDPClient is the class streaming UDPPackets towards a single UDPServer, 
+   based on the size of the frame to send. Packets are built from templates 
+   (see UDPPacketizer), unless disabled, and those of a frame can be spread 
+   over an interval of spread seconds, instead of being sent in a burst.
+   """
+
+   templates = True
+
+   def __init__(self, addr, flow = 0, spread = 0, templates = None):
+      try:
+         self.ON = True
+         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+         self.dest = (addr, UDPServer.port)
+         self.flow = flow
+         self.timestamp = 0
+         self.spread = spread
+         if templates is None:
+            templates = UDPClient.templates
+         self.packetizer = UDPPacketizer(flow) if templates else None
+         self.fragmenter = UDPFragmenter(flow)
+      except socket.error, msg:
+         print 'Socket creation error:', msg
+         self.ON = False
+
+   def close(self):
+      self.ON = False
+      self.s.close()
+      
+   def isAlive(self):
+      return self.ON
+ 
+   def send(self, frame_size):
+      
+      if not self.ON:
+         return
+      
+      # S = N*UDPPacket.payload_size + M bytes
+      S = int(125*frame_size)
+      N = S / UDPPacket.payload_size
+      M = S % UDPPacket.payload_size
+
+      try:
+         if self.packetizer is not None:
+            self.timestamp = self.packetizer.send(self.s, self.dest, self.timestamp, 
+                                                  N, M, self.spread)
+            return
+
+         for i in range(N):
+            self.s.sendto(UDPPacket.encode(self.timestamp, UDPPacket.payload_size, self.flow), self.dest)
+            self.timestamp += 1
+            
+         if M != 0:
+            self.s.sendto(UDPPacket.encode(self.timestamp, M, self.flow), self.dest)
+            self.timestamp += 1
+
+      except socket.error, msg:
+         print 'Unable to send the UDP stream:', msg
+         self.ON = False
+
+   # Sends NAL units, given as (offset, size) in data (see UDPFragmenter).
+   def sendNAL(self, data, units):
+      if not self.ON:
+         return
+      try:
+         self.timestamp = self.fragmenter.send(self.s, self.dest, self.timestamp, 
+                                               data, units, self.spread)
+      except socket.error, msg:
+         print 'Unable to send the UDP stream:', msg
          self.ON = False
\ No newline at end of file
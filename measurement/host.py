@@ -0,0 +1,65 @@
+"""
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the implementation of the Host class, which runs several
+senders (sender.py) in a single process, for emulations with many senders.
+"""
+
+from threading import Thread
+from tcpmodule import *
+from sender import Sender
+
+class Host:
+
+   """
+   A Host runs several logical senders in a single process. Their addresses
+   are of the form 'ip:name', where ip is the address of the host. They share
+   the TCP server of the host, which delivers the messages to the mailbox of
+   their logical destination, and the connections of the TCPClient. Each
+   sender runs its measure in its own thread, and writes its results in its
+   own file, as if it were alone.
+   """
+
+   def __init__(self, addr, hosted, senders, groups = None):
+      self.ON = True
+      self.senders = []
+      self.tcpServer = None
+
+      # Every hosted sender must be in the list of senders.
+      unknown = [src for src, dest in hosted if src not in senders]
+      if unknown:
+         print 'Hosted senders missing from the list of senders:', ' '.join(unknown)
+         self.ON = False
+         return
+
+      # Messages towards senders that are not hosted here are dropped.
+      self.tcpServer = TCPServer(addr, None)
+      self.tcpServer.start()
+
+      # hosted is a list of pairs (logical address, listener).
+      for src, dest in hosted:
+         self.senders.append(Sender(src, dest, senders, senders.index(src), groups, self.tcpServer))
+
+      self.ON = self.tcpServer.isAlive()
+
+   def close(self):
+      for sender in self.senders:
+         sender.close()
+
+      if self.tcpServer is not None:
+         self.tcpServer.close()
+         self.tcpServer.join()
+      TCPClient.close()
+
+   def isAlive(self):
+      return self.ON
+
+   # Runs the measure of every sender, and waits for all of them to finish.
+   def run(self):
+      threads = [Thread(target = sender.run) for sender in self.senders]
+      for t in threads:
+         t.daemon = True
+         t.start()
+      for t in threads:
+         t.join()
\ No newline at end of file
@@ -1,63 +1,137 @@
-""" 
-Author: Cedric Bonhomme
-Date: 19-07-2015
-
-This file contains the implementation of the Listener class, whose job is to 
-listen to senders (sender.py) streaming udp content and reply resulting 
-statistics.
-"""
-
-import Queue
-from tcpmodule import *
-from udpmodule import *
-
-class Listener:
-
-   """
-   Listener is a class containing two threads, respectively handling incoming 
-   TCP and UDP requests. The main method run() handles the communication 
-   between those threads.
-   """
-   
-   expiration = 5
-   
-   def __init__(self, dest):
-      self.ON = True
-      self.tcp_queue = Queue.Queue()
-      self.tcpServer = TCPServer(dest, self.tcp_queue)
-      self.udpServer = UDPServer(dest)
-      self.tcpServer.start()
-      self.udpServer.start()
-      
-      # Both servers must be alive for the listener to be alive too.
-      self.ON = self.udpServer.isAlive() and self.tcpServer.isAlive()
-      
-   def close(self):
-      print 'Shutting down...'
-      
-      self.ON = False
-      self.tcpServer.close()
-      self.udpServer.close()
-      self.tcpServer.join()
-      self.udpServer.join()
-
-   def isAlive(self):
-      return self.ON
-      
-   def run(self):
-      while self.ON:
-         try:
-            payload, src = self.tcp_queue.get(True, Listener.expiration)
-
-            # Sender at address 'src' starts a UDP measure.
-            if payload[0] == 'init_stream':
-               self.udpServer.addFlow(src, payload[1][0])
-               
-            # Sender at address 'src' closes its UDP measure.
-            # The listener replies with the rho and sigma measure.
-            elif payload[0] == 'close_stream':
-               self.ON = TCPClient.send(src, 'close_ack', self.udpServer.delFlow(src))
-
-         # Checking periodically if both TCP and UDP servers are still alive.
-         except Queue.Empty: 
-             self.ON = self.tcpServer.isAlive() and self.udpServer.isAlive()
\ No newline at end of file
+""" 
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the implementation of the Listener class, whose job is to 
+listen to senders (sender.py) streaming udp content and reply resulting 
+statistics.
+"""
+
+import Queue
+from tcpmodule import *
+from udpmodule import *
+from reactor import Reactor
+
+class Listener:
+
+   """
+   Listener is a class containing two threads, respectively handling incoming 
+   TCP and UDP requests. The main method run() handles the communication 
+   between those threads. UDP requests can be handled by several worker 
+   processes instead. If evented, both servers are run by a single reactor, 
+   and the messages are handled as soon as they come in.
+   """
+   
+   expiration = 5
+   
+   def __init__(self, dest, workers = 1, evented = False):
+      self.ON = True
+      self.reactor = Reactor() if evented else None
+      self.outbox = TCPOutbox() if evented else None
+      self.threads = [] # Servers running in their own thread or process.
+
+      # Worker processes are started first, so that they do not inherit the 
+      # socket of the TCP server.
+      if workers > 1:
+         self.udpServer = UDPWorkers(dest, workers)
+      else:
+         self.udpServer = UDPServer(dest)
+      self.start(self.udpServer)
+
+      # The TCP server hands the messages to the listener itself if evented.
+      if evented:
+         self.tcpServer = TCPServer(dest, self)
+      else:
+         self.tcp_queue = Queue.Queue()
+         self.tcpServer = TCPServer(dest, self.tcp_queue)
+      self.start(self.tcpServer)
+      
+      # Both servers must be alive for the listener to be alive too.
+      self.ON = self.udpServer.isAlive() and self.tcpServer.isAlive()
+      
+   def close(self):
+      print 'Shutting down...'
+      
+      self.ON = False
+      self.tcpServer.close()
+      self.udpServer.close()
+      for server in self.threads:
+         server.join()
+      if self.reactor is not None:
+         self.reactor.close()
+         self.outbox.close()
+      TCPClient.close()
+
+   def isAlive(self):
+      return self.ON
+
+   # Starts a server, or attaches it to the reactor if possible. Worker 
+   # processes are started when attached, and still joined.
+   def start(self, server):
+      if self.reactor is not None and hasattr(server, 'attach'):
+         if server.isAlive():
+            server.attach(self.reactor)
+         if isinstance(server, UDPWorkers):
+            self.threads.append(server)
+      else:
+         server.start()
+         self.threads.append(server)
+
+   # Called by the TCP server for each message, if evented.
+   def put(self, message):
+      self.handle(*message)
+      if not self.ON:
+         self.reactor.stop()
+
+   # Replies to a sender. If evented, the reply is posted to the outbox, so 
+   # that an unreachable sender never blocks the reactor.
+   def reply(self, dest, payload_type, attr = None):
+      if self.outbox is not None:
+         self.outbox.post(dest, payload_type, attr, Listener.expiration)
+         return True
+      return TCPClient.send(dest, payload_type, attr)
+
+   # Replies to a sender with the statistics of its stream.
+   def acknowledge(self, dest, log):
+      self.ON = self.reply(dest, 'close_ack', log)
+
+   # Checks if both TCP and UDP servers are still alive.
+   def check(self):
+      self.ON = self.tcpServer.isAlive() and self.udpServer.isAlive()
+      if not self.ON and self.reactor is not None:
+         self.reactor.stop()
+
+   def handle(self, payload, src):
+      # The UDP streams of a logical sender come from its host.
+      host = TCPClient.route(src)
+
+      # Sender at address 'src' starts a UDP measure, identified by 
+      # a flow identifier (0 by default).
+      if payload[0] == 'init_stream':
+         flow = payload[1][1] if len(payload[1]) > 1 else 0
+         self.udpServer.addFlow(host, payload[1][0], flow)
+         
+      # Sender at address 'src' closes its UDP measure.
+      # The listener replies with the rho and sigma measure, once the 
+      # workers sent their statistics if they are read by the reactor.
+      elif payload[0] == 'close_stream':
+         flow = payload[1][0] if payload[1] else 0
+         self.udpServer.delFlow(host, flow, lambda log: self.acknowledge(src, log))
+      
+   def run(self):
+      # Servers attached to the reactor stop it on error. The others are 
+      # still checked periodically.
+      if self.reactor is not None:
+         timer = self.reactor.every(Listener.expiration, self.check)
+         self.reactor.run()
+         timer.cancel()
+         return
+
+      while self.ON:
+         try:
+            payload, src = self.tcp_queue.get(True, Listener.expiration)
+            self.handle(payload, src)
+
+         # Checking periodically if both TCP and UDP servers are still alive.
+         except Queue.Empty: 
+             self.check()
\ No newline at end of file
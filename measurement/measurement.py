@@ -1,59 +1,105 @@
-#!/usr/bin/python
-
-""" 
-Author: Cedric Bonhomme
-Date: 19-07-2015
-
-This file consists in the interface of the measurement tool.
-"""
-
-import sys
-import time
-from sender import Sender
-from listener import Listener
-
-# Parse the file containing the IP addresses of all senders.
-def parse(f, src):
-   senders = []
-   index = -1
-   
-   try:
-      file = open(f, 'r')
-      for line in file:
-         if not line.strip(): continue
-         senders.append(line.split()[0])
-         if line.split()[0] == src: 
-            index = len(senders) - 1
-   except IOError: 
-      print 'Cannot open', f
-      senders = None
-      index = -1
-      self.ON = False
-   finally:
-      file.close()
-      return senders, index
-
-if len(sys.argv) == 5 and sys.argv[1] == '--send':
-   print 'Starting the measurement tool from', sys.argv[2], 'to', sys.argv[3]
-   time.sleep(1)
-   
-   senders, index = parse(sys.argv[4], sys.argv[2])
-   if index == -1:
-      sys.exit(0)
-   
-   sender = Sender(sys.argv[2], sys.argv[3], senders, index)
-   if sender.isAlive():
-      sender.run()
-   sender.close()
-   
-elif len(sys.argv) == 3 and sys.argv[1] == '--listen':
-   print 'Listening at', sys.argv[2]
-   listener = Listener(sys.argv[2])
-   if listener.isAlive():
-      listener.run()
-   listener.close()
-   
-else:
-   print 'python measurement.py [--send|--listen] addr'
-
+#!/usr/bin/python
+
+""" 
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file consists in the interface of the measurement tool.
+"""
+
+import sys
+import time
+from sender import Sender
+from listener import Listener
+from host import Host
+
+# Parse the file containing the IP addresses of all senders. Each line may 
+# also contain the group of the sender (senders sharing a bottleneck).
+def parse(f, src):
+   senders = []
+   groups = []
+   index = -1
+   
+   try:
+      file = open(f, 'r')
+      for line in file:
+         if not line.strip(): continue
+         senders.append(line.split()[0])
+         groups.append(line.split()[1] if len(line.split()) > 1 else None)
+         if line.split()[0] == src: 
+            index = len(senders) - 1
+   except IOError: 
+      print 'Cannot open', f
+      senders = None
+      index = -1
+      self.ON = False
+   finally:
+      file.close()
+      return senders, groups, index
+
+# Parse the file containing the senders hosted by a process: each line is 
+# made of the logical address of a sender and the address of its listener.
+def parse_hosted(f):
+   hosted = []
+   try:
+      file = open(f, 'r')
+      for line in file:
+         if not line.strip(): continue
+         hosted.append((line.split()[0], line.split()[1]))
+   except IOError:
+      print 'Cannot open', f
+      hosted = None
+   finally:
+      file.close()
+      return hosted
+
+if len(sys.argv) == 5 and sys.argv[1] == '--send':
+   print 'Starting the measurement tool from', sys.argv[2], 'to', sys.argv[3]
+   time.sleep(1)
+   
+   senders, groups, index = parse(sys.argv[4], sys.argv[2])
+   if index == -1:
+      sys.exit(0)
+   
+   sender = Sender(sys.argv[2], sys.argv[3], senders, index, groups)
+   if sender.isAlive():
+      sender.run()
+   sender.close()
+   
+elif len(sys.argv) == 5 and sys.argv[1] == '--host':
+   print 'Starting the measurement tool for the senders of', sys.argv[2]
+   time.sleep(1)
+
+   senders, groups, index = parse(sys.argv[4], sys.argv[2])
+   hosted = parse_hosted(sys.argv[3])
+   if not senders or not hosted:
+      sys.exit(0)
+
+   host = Host(sys.argv[2], hosted, senders, groups)
+   if host.isAlive():
+      host.run()
+   host.close()
+
+elif len(sys.argv) in (3, 4, 5) and sys.argv[1] == '--listen':
+   print 'Listening at', sys.argv[2]
+   
+   # The servers can be run by a single event loop.
+   evented = '--evented' in sys.argv
+   if evented:
+      sys.argv.remove('--evented')
+
+   # The UDP reception can be spread over several worker processes.
+   workers = 1
+   if len(sys.argv) == 4:
+      workers = int(sys.argv[3])
+   listener = Listener(sys.argv[2], workers, evented)
+   if listener.isAlive():
+      listener.run()
+   listener.close()
+   
+else:
+   print 'python measurement.py [--send|--listen] addr'
+   print 'python measurement.py --listen addr [workers] [--evented]'
+   print 'python measurement.py --host addr hosted senders_list'
+
 sys.exit(0)
\ No newline at end of file
@@ -0,0 +1,86 @@
+""" 
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the probing strategies used by senders to find the rate at 
+which a condition changes (e.g. the rate above which the measured rho does 
+not follow the sending rate anymore). A probe gives the next rate to try, and 
+is updated with the result of each measurement round.
+"""
+
+###############################################################################
+class LinearProbe:
+
+   """
+   LinearProbe increases the rate by a constant step, until the limit is 
+   reached. The probe stops at the first rate above the limit, and keeps the 
+   result of the last round above it.
+   """
+
+   def __init__(self, start, step):
+      self.value = start # Next rate to try.
+      self.step = step
+      self.done = False
+      self.rounds = 0
+      self.result = None # Result of the last round above the limit.
+
+   # The limit is above the current rate if below is True. The result of the 
+   # round (e.g. its rho and sigma) is kept if it is above the limit.
+   def update(self, below, result = None):
+      self.rounds += 1
+      if not below:
+         self.result = result
+      if self.done:
+         return
+      if below:
+         self.value += self.step
+      else:
+         self.done = True
+
+###############################################################################
+class BisectProbe:
+
+   """
+   BisectProbe brackets the limit by increasing the rate with an exponentially 
+   growing step, then bisects the bracket until it is smaller than the given 
+   precision. The probe stops at the upper bound of the bracket, that is, the 
+   lowest rate tried above the limit, and keeps the result of the round at 
+   that rate: the rounds above the limit are at decreasing rates.
+   """
+
+   def __init__(self, start, step, precision):
+      self.value = start # Next rate to try.
+      self.step = step
+      self.precision = precision
+      self.low = None # Highest rate tried below the limit.
+      self.high = None # Lowest rate tried above the limit.
+      self.done = False
+      self.rounds = 0
+      self.result = None # Result of the round at high.
+
+   # The limit is above the current rate if below is True. The result of the 
+   # round (e.g. its rho and sigma) is kept if it is above the limit.
+   def update(self, below, result = None):
+      self.rounds += 1
+      if not below:
+         self.result = result
+      if self.done:
+         return
+      if below:
+         self.low = self.value
+      else:
+         self.high = self.value
+
+      # The starting rate is already above the limit.
+      if self.low is None:
+         self.done = True
+      # Bracketing: the step is doubled at each round.
+      elif self.high is None:
+         self.value = self.low + self.step
+         self.step *= 2
+      # Bisection, until the required precision is reached.
+      elif self.high - self.low <= self.precision:
+         self.value = self.high
+         self.done = True
+      else:
+         self.value = (self.low + self.high)/2
\ No newline at end of file
@@ -1,58 +1,134 @@
-#!/usr/bin/python
-
-""" 
-Author: Cedric Bonhomme
-Date: 19-07-2015
-
-This script launches a Mininet session with the measurement tool.
-The different paths are given in a file in argument.
-"""
-
-import sys
-import time
-from mininet.topo import Topo
-from mininet.net import Mininet
-from mininet.util import dumpNodeConnections
-from mininet.log import setLogLevel
-from mininet.node import OVSController
-from topos import *
-
-if len(sys.argv) != 2:
-   print 'Usage: python mininet.py path_file'
-   exit(0)
-
-setLogLevel('info')   
-net = Mininet(topo=LineTopo(1,1), controller = OVSController)
-net.start()
-
-paths = []
-path_file = open(sys.argv[1], 'r')
-senders = open('senders', 'w')
-for line in path_file:
-   if not line.strip(): continue
-   path = line.strip().split(' ')
-   src = net.getNodeByName(path[0])
-   dest = net.getNodeByName(path[1])
-   paths.append((src, dest))
-   senders.write(src.IP() + '\n')
-
-path_file.close()
-senders.close()
-
-for i in range(len(paths)):
-   b = False
-   for j in range(i):
-      if paths[i][1].IP() == paths[j][1].IP():
-         b = True
-         break
-   if not b:
-      paths[i][1].cmd('xterm -hold -e python measurement.py --listen %s &' % (paths[i][1].IP()))
-
-for i in range(len(paths)):
-   if i < len(paths)-1:
-      paths[i][0].cmd('xterm -hold -e python measurement.py --send %s %s senders &' % (paths[i][0].IP(), paths[i][1].IP()))
-   else:
-      paths[i][0].cmd('xterm -hold -e python measurement.py --send %s %s senders  ' % (paths[i][0].IP(), paths[i][1].IP()))
- 
-net.stop()
+#!/usr/bin/python
+
+""" 
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This script launches a Mininet session with the measurement tool.
+The different paths are given in a file in argument.
+"""
+
+import sys
+import time
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.util import dumpNodeConnections
+from mininet.log import setLogLevel
+from mininet.node import OVSController
+from topos import *
+
+if len(sys.argv) != 2:
+   print 'Usage: python mininet.py path_file'
+   exit(0)
+
+# Returns the links of the path between two nodes of a topology (a tree), as 
+# pairs of node names.
+def path_links(topo, src, dest):
+   adj = {}
+   for a, b in topo.links():
+      adj.setdefault(a, []).append(b)
+      adj.setdefault(b, []).append(a)
+
+   # Breadth-first search from the source.
+   prev = {src: None}
+   queue = [src]
+   for node in queue:
+      for n in adj.get(node, []):
+         if n not in prev:
+            prev[n] = node
+            queue.append(n)
+
+   links = set()
+   node = dest
+   while prev.get(node) is not None:
+      links.add(frozenset((node, prev[node])))
+      node = prev[node]
+   return links
+
+# Returns the group of each path: paths sharing a link may share a bottleneck, 
+# hence are in the same group, while groups of paths sharing no link run their 
+# r" rounds in parallel.
+def link_groups(links):
+   groups = range(len(links))
+   for i in range(len(links)):
+      for j in range(i):
+         if links[i] & links[j]:
+            old = groups[i]
+            groups = [groups[j] if g == old else g for g in groups]
+   return groups
+
+setLogLevel('info')   
+net = Mininet(topo=LineTopo(1,1), controller = OVSController)
+net.start()
+
+paths = []
+path_file = open(sys.argv[1], 'r')
+for line in path_file:
+   if not line.strip(): continue
+   path = line.strip().split(' ')
+   src = net.getNodeByName(path[0])
+   dest = net.getNodeByName(path[1])
+   # The optional third field is the group of the sender.
+   group = path[2] if len(path) > 2 else None
+   paths.append((src, dest, group))
+path_file.close()
+
+# Unless given, the groups are computed from the links of the paths.
+if all(p[2] is None for p in paths):
+   groups = link_groups([path_links(net.topo, p[0].name, p[1].name) for p in paths])
+   paths = [(p[0], p[1], str(g)) for p, g in zip(paths, groups)]
+
+# Several senders on the same node are hosted by a single process, and get 
+# logical addresses 'ip:k'.
+count = {}
+for p in paths:
+   count[p[0].IP()] = count.get(p[0].IP(), 0) + 1
+
+addrs = []
+hosted = {}
+senders = open('senders', 'w')
+for p in paths:
+   ip = p[0].IP()
+   if count[ip] == 1:
+      addr = ip
+   else:
+      hosted.setdefault(ip, []).append((p[0], p[1]))
+      addr = '%s:%d' % (ip, len(hosted[ip]))
+   addrs.append(addr)
+
+   if p[2] is not None:
+      senders.write(addr + ' ' + p[2] + '\n')
+   else:
+      senders.write(addr + '\n')
+senders.close()
+
+for i in range(len(paths)):
+   b = False
+   for j in range(i):
+      if paths[i][1].IP() == paths[j][1].IP():
+         b = True
+         break
+   if not b:
+      paths[i][1].cmd('xterm -hold -e python measurement.py --listen %s &' % (paths[i][1].IP()))
+
+cmds = []
+for i in range(len(paths)):
+   ip = paths[i][0].IP()
+   if count[ip] == 1:
+      cmds.append((paths[i][0], '--send %s %s senders' % (ip, paths[i][1].IP())))
+   # The file of the senders hosted by a node is written once.
+   elif addrs[i] == ip + ':1':
+      file = open('hosted_' + ip, 'w')
+      for k in range(len(hosted[ip])):
+         file.write('%s:%d %s\n' % (ip, k + 1, hosted[ip][k][1].IP()))
+      file.close()
+      cmds.append((paths[i][0], '--host %s hosted_%s senders' % (ip, ip)))
+
+for i in range(len(cmds)):
+   if i < len(cmds)-1:
+      cmds[i][0].cmd('xterm -hold -e python measurement.py %s &' % cmds[i][1])
+   else:
+      cmds[i][0].cmd('xterm -hold -e python measurement.py %s  ' % cmds[i][1])
+ 
+net.stop()
 sys.exit(0)
\ No newline at end of file
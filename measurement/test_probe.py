@@ -0,0 +1,78 @@
+"""
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the tests of the probing strategies of the rates, against
+a simulated limit. Run from this directory with: python -m unittest discover
+"""
+
+import random
+import unittest
+from probe import LinearProbe, BisectProbe
+
+###############################################################################
+class TestProbe(unittest.TestCase):
+
+   """
+   A round below the limit measures its own rate and no sigma (-1), while a
+   round above it measures the limit and its sigma, as the senders do.
+   """
+
+   # Runs the probe until done, and returns the rates tried.
+   def search(self, probe, limit):
+      rates = []
+      while not probe.done:
+         bw = probe.value
+         rates.append(bw)
+         if bw < limit:
+            probe.update(True, (bw, -1))
+         else:
+            probe.update(False, (limit, bw - limit))
+      return rates
+
+   def test_bisect(self):
+      r = random.Random(42)
+      for trial in range(500):
+         start = r.randint(100, 5000)
+         limit = start + r.randint(1, 100000)
+         probe = BisectProbe(start, 100, 50)
+         rates = self.search(probe, limit)
+
+         # The probe stops at the lowest rate tried above the limit, within
+         # the precision.
+         self.assertTrue(probe.low < limit <= probe.high)
+         self.assertTrue(probe.high - probe.low <= 50)
+         self.assertEqual(probe.value, probe.high)
+         self.assertEqual(probe.high, min(b for b in rates if b >= limit))
+
+         # The result is that of the round at high, even if the last round
+         # was below the limit.
+         self.assertEqual(probe.result, (limit, probe.high - limit))
+
+   def test_bisect_rounds(self):
+      rates = self.search(BisectProbe(1000, 100, 50), 100000)
+      linear = self.search(LinearProbe(1000, 100), 100000)
+      self.assertTrue(len(rates) < 25)
+      self.assertEqual(len(linear), 991)
+
+   def test_above(self):
+      for probe in (BisectProbe(1000, 100, 50), LinearProbe(1000, 100)):
+         self.assertEqual(self.search(probe, 500), [1000])
+         self.assertEqual(probe.result, (500, 500))
+
+   def test_linear(self):
+      probe = LinearProbe(1000, 100)
+      self.assertEqual(self.search(probe, 1250), [1000, 1100, 1200, 1300])
+      self.assertEqual(probe.result, (1250, 50))
+
+   # Rounds after the end keep the result of the last round above the limit.
+   def test_done(self):
+      probe = BisectProbe(1000, 100, 50)
+      self.search(probe, 3010)
+      result = probe.result
+      probe.update(True, (3000, -1))
+      self.assertEqual(probe.result, result)
+      self.assertTrue(probe.done)
+
+if __name__ == '__main__':
+   unittest.main()
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the tests of the binary format of the TCP messages and of
+their reassembly. Run from this directory with: python -m unittest discover
+"""
+
+import unittest
+from tcpmodule import TCPPacket, TCPStream
+
+###############################################################################
+class TestTCPPacket(unittest.TestCase):
+
+   """
+   Messages are encoded and decoded back, with and without their logical
+   source and destination.
+   """
+
+   messages = [('start', None), ('finish', [1500]), ('continue', [1.5e9, True]),
+               ('stop', [False]), ('init_stream', [2000, 3]),
+               ('close_ack', [5084, -1, 'kernel', 215, [170, 340, 2**40]]),
+               ('report', [[1, 2.5], [], 'x', None, -2**31, 2**31, 2**63 - 1]),
+               ('custom', ['a' * 100000]), ('close_stream', [1.5, 2.5])]
+
+   def decode(self, data):
+      size = TCPPacket.length.size
+      self.assertEqual(TCPPacket.length.unpack_from(data)[0], len(data) - size)
+      return TCPPacket.decode(data, size)
+
+   def test_round_trip(self):
+      for type, attr in TestTCPPacket.messages:
+         self.assertEqual(self.decode(TCPPacket.encode(type, attr)),
+                          ((type, attr), None, None))
+         self.assertEqual(self.decode(TCPPacket.encode(type, attr, '10.0.0.1:1', '10.0.0.2:3')),
+                          ((type, attr), '10.0.0.1:1', '10.0.0.2:3'))
+
+   # Tuples and unicode strings are sent as lists and strings.
+   def test_conversions(self):
+      self.assertEqual(self.decode(TCPPacket.encode('stop', (1, u'\xe9')))[0],
+                       ('stop', [1, '\xc3\xa9']))
+
+   def test_compact(self):
+      self.assertTrue(len(TCPPacket.encode('continue', [1.5e9, True])) < 30)
+
+   def test_unknown(self):
+      data = TCPPacket.encode('stop', [True])
+      size = TCPPacket.length.size
+      for k, b in ((size, chr(TCPPacket.version + 1)), (size, '['),
+                   (size + 2, chr(len(TCPPacket.types)))):
+         bad = data[:k] + b + data[k + 1:]
+         self.assertRaises(ValueError, TCPPacket.decode, bad, size)
+      self.assertRaises(TypeError, TCPPacket.encode, 'stop', [object()])
+
+###############################################################################
+class TestTCPStream(unittest.TestCase):
+
+   """
+   Messages are received in pieces of any size, and decoded in order.
+   """
+
+   def receive(self, data, n):
+      stream = TCPStream()
+      decoded = []
+      while data:
+         space = stream.space()
+         k = min(n, len(space), len(data))
+         space[:k] = data[:k]
+         data = data[k:]
+         stream.received(k)
+         decoded.extend(stream.messages())
+      return decoded
+
+   def test_pieces(self):
+      data = ''.join(TCPPacket.encode(t, a) for t, a in TestTCPPacket.messages)
+      expected = [((t, a), None, None) for t, a in TestTCPPacket.messages]
+      for n in (1, 3, 1000, TCPStream.size, len(data)):
+         self.assertEqual(self.receive(data, n), expected)
+
+if __name__ == '__main__':
+   unittest.main()
\ No newline at end of file
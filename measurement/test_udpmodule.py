@@ -0,0 +1,127 @@
+"""
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the tests of the sequence window of the UDP flows, checked
+against a brute force model of the arrivals. Run from this directory with:
+python -m unittest discover
+"""
+
+import random
+import unittest
+from udpmodule import UDPWindow
+
+###############################################################################
+class Model:
+
+   """
+   Model keeps every sequence number received in a set. As in UDPWindow, a
+   number arriving once it left the window is ignored.
+   """
+
+   def __init__(self, size):
+      self.size = size
+      self.received = set([0])
+      self.current = 0
+
+   def add(self, n):
+      if n > self.current:
+         missing = n - self.current - 1
+         self.current = n
+         self.received.add(n)
+         return missing
+      if n <= self.current - self.size or n in self.received:
+         return 0
+      self.received.add(n)
+      return -1
+
+   def missing(self):
+      return self.current + 1 - len(self.received)
+
+   def first_missing(self):
+      for n in range(self.current + 1):
+         if n not in self.received:
+            return n
+      return -1
+
+###############################################################################
+class TestUDPWindow(unittest.TestCase):
+
+   """
+   The window is made small, so that numbers often leave it.
+   """
+
+   size = 16
+
+   def setUp(self):
+      self.default = UDPWindow.size
+      UDPWindow.size = TestUDPWindow.size
+      self.random = random.Random(42)
+
+   def tearDown(self):
+      UDPWindow.size = self.default
+
+   # Returns the numbers 1..n, some of them lost, duplicated or delayed (by up
+   # to delay windows).
+   def arrivals(self, n, loss = 0.1, delay = 1.5):
+      nums = [k for k in range(1, n) if self.random.random() >= loss]
+      nums += [k for k in nums if self.random.random() < 0.05]
+      nums.sort(key = lambda k: k + self.random.random()*delay*TestUDPWindow.size)
+      return nums
+
+   def check(self, w, m):
+      self.assertEqual(w.current, m.current)
+      self.assertEqual(w.missing(), m.missing())
+      self.assertEqual(w.first_missing(), m.first_missing())
+
+   def test_add(self):
+      for trial in range(200):
+         w = UDPWindow()
+         m = Model(TestUDPWindow.size)
+         for n in self.arrivals(self.random.randint(1, 200)):
+            self.assertEqual(w.add(n), m.add(n))
+            self.check(w, m)
+
+   def test_in_order(self):
+      w = UDPWindow()
+      for n in range(1, 100):
+         self.assertEqual(w.add(n), 0)
+      self.assertEqual(w.missing(), 0)
+      self.assertEqual(w.first_missing(), -1)
+
+   # A flow is merged with the empty windows of the other workers.
+   def test_merge_empty(self):
+      for trial in range(50):
+         nums = self.arrivals(self.random.randint(1, 200))
+         w = UDPWindow()
+         m = Model(TestUDPWindow.size)
+         for n in nums:
+            w.add(n)
+            m.add(n)
+         for a, b in ((w, UDPWindow()), (UDPWindow(), w)):
+            a.merge(b)
+            self.check(a, m)
+
+   # Windows holding all their numbers are merged exactly.
+   def test_merge_split(self):
+      for trial in range(200):
+         nums = self.arrivals(self.random.randint(1, TestUDPWindow.size), 0.2, 0)
+         a = UDPWindow()
+         b = UDPWindow()
+         m = Model(TestUDPWindow.size)
+         for n in nums:
+            (a if self.random.random() < 0.5 else b).add(n)
+         for n in sorted(nums):
+            m.add(n)
+         a.merge(b)
+         self.check(a, m)
+
+   def test_merge_slid(self):
+      a = UDPWindow()
+      b = UDPWindow()
+      for n in range(1, 4*TestUDPWindow.size):
+         (a if n % 2 else b).add(n)
+      self.assertRaises(AssertionError, a.merge, b)
+
+if __name__ == '__main__':
+   unittest.main()
\ No newline at end of file
@@ -1,243 +1,578 @@
-""" 
-Author: Cedric Bonhomme
-Date: 19-07-2015
-
-This file contains the implementation of the UDP module, used in senders 
-(UDPClient) and listeners (UDPServer).
-UDPClients send UDPPackets to UDPServers at a given rate, while those 
-servers keep tracks on various statistics about their incoming streams.
-"""
-
-import time
-import socket
-from threading import Thread
-
-###############################################################################
-class UDPPacket:
-
-   """
-   UDPPacket is the data structure representing UDP packets. The payload size 
-   is fixed to 1250 bytes (10kb) to ease the measurement. The separation 
-   between header and payload allows to measure the goodput only. Each packet 
-   has a timestamp, in order to track losses. It contains only two static 
-   methods: encode and decode.
-   """
-
-   payload_size = 1250
-   timestamp_size = 10
-   header_size = timestamp_size + 2 # Minimum RTP header size.
-   tot_size = header_size + payload_size
-
-   header = 'a' * (header_size - timestamp_size)
-   payload = 'b' * payload_size
-   
-   @staticmethod
-   def decode(data):
-      return int(data[0:10])
-
-   @staticmethod
-   def encode(timestamp):
-      return ('%010d' % (timestamp%10000000000)) + UDPPacket.header + UDPPacket.payload
-      
-###############################################################################
-class UDPFlow:
-
-   """
-   UDPFlow is a data structure used by UDPServers to keep tracks of incoming 
-   UDP streams and to compute statistics about them.   
-   """
-
-   dt = 1
-   
-   # There must be only one stream per source.
-   def __init__(self, src, bw):
-      self.src = src
-      self.bw = bw
-      self.miss = [] # List of missing (delayed or lost) packets.
-      self.N = [] # Array of arrived packets.
-      self.N.append(0)
-      self.current = (0,0) # Timestamp and arrival time of the last packet.
-
-      # Based on the bandwidth, the number of packets per second can be computed. 
-      self.M = max(UDPClient.bps, self.bw / (UDPPacket.payload_size/125))
-      self.Mratio = self.M / UDPClient.bps
-      self.Mmod = self.M % UDPClient.bps
-
-   def add(self, timestamp, t):
-
-      # The initial time is taken at the arrival of the first packet.
-      if self.N[0] == 0:
-         self.t_init = t
-
-      # Arrival time is relative to t_init.
-      self.dt = t - self.t_init
-
-      # Each packet arrives in a specific time interval of size dt.
-      if self.dt < len(self.N) * UDPFlow.dt:
-         self.N[len(self.N) - 1] += 1
-      else:
-         self.N.append(1)
-      
-      # The incoming packet is delayed.
-      if timestamp < self.current[0]:
-         for i in range(len(self.miss)):
-            if self.miss[i] == timestamp:
-               self.miss.pop(i)
-               break
-
-      # The incoming packet is not delayed, but prior packets may be missing.
-      elif timestamp > self.current[0]:
-         for i in range(self.current[0] + 1, timestamp):
-            self.miss.append(i)
-         self.current = (timestamp, self.dt)
-
-   # Returns the (rho, sigma) parameters based on the stream's statistics.
-   def log(self):
-      # rho = db/dt
-      rho = float(sum(self.N)*UDPPacket.payload_size)/float(125*self.dt)
-      
-      """
-      print '----------------------'
-      for t in self.miss:
-         print t, self.compute_dt(t)
-      """
-
-      # sigma = db*dt
-      if self.miss:
-         t = self.miss[0]
-         sigma = (self.bw - rho) * self.compute_dt(self.miss[0])
-      # No loss: undefined.
-      else:
-         sigma = -1
-
-      # Values are rounded to integers.
-      return int(rho), int(sigma)
-      
-   # Compute the relative sending time based on the timestamp and the bandwidth.
-   def compute_dt(self, t):
-      dt = t / self.M
-      t -= dt*self.M
-
-      if t < self.Mmod*(self.Mratio+1):
-         dt += (t /(self.Mratio+1))*UDPClient.dt
-      else:
-         dt += self.Mmod*UDPClient.dt
-         t -= self.Mmod*(self.Mratio+1)
-         dt += (t/self.Mratio)*UDPClient.dt
-      return dt   
-
-###############################################################################
-class UDPServer(Thread):
-
-   """
-   UDPServer is a thread handling incoming UDPPackets. If packets belong to an 
-   existing flow, they are added to it, or discarded otherwise.
-   """
-   
-   port = 6000
-   expiration = 3
-   
-   def __init__(self, addr):
-      Thread.__init__(self)
-      try:
-         self.ON = True
-         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-         self.s.bind((addr, UDPServer.port))
-         self.s.settimeout(UDPServer.expiration)
-         self.flowHandler = []
-      except socket.error, msg:
-         print 'Socket creation error:', msg
-         self.ON = False      
-      
-   def close(self):
-      self.ON = False
-      self.s.close()
-
-   def isAlive(self):
-      return self.ON
-
-   # Finds a flow based on an IP address.
-   def find(self, src):
-      for i in range(len(self.flowHandler)):
-         if self.flowHandler[i].src == src:
-            return i
-      return -1
-
-   # Adds a flow to the flow handler.
-   def addFlow(self, src, bw):
-      self.flowHandler.append(UDPFlow(src, bw))
-
-   # Removes a flow from the flow handler and returns (rho,sigma).
-   def delFlow(self, src):
-      f = self.find(src)
-      if f == -1: 
-         return ''
-      stats = self.flowHandler[f].log()
-      self.flowHandler.pop(f)
-      return stats
-
-   # Infinite loop handling incoming packets.
-   def run(self):
-      while self.ON:
-         try:
-            d = self.s.recvfrom(UDPPacket.tot_size) # Blocking operation.
-            t = time.time()
-            f = self.find(d[1][0])
-            if d[0] and f != -1:
-               self.flowHandler[f].add(UDPPacket.decode(d[0]), t)
-
-         # The timeout allows for closing the server properly.
-         except socket.timeout:
-            continue
-         except socket.error, msg:
-            print 'Socket error:', msg
-            self.ON = False 
-
-###############################################################################
-class UDPClient:
-
-   """
-   UDPClient is the class streaming UDPPackets at a given rate, towards a 
-   single UDPServer. It contains a single static method.
-   """
-
-   # Bursts per second: packets are sent at discrete, finite times. Setting 
-   # a frequency similar to those in video streaming gives a measure that is 
-   # close to the real behaviour of its target application.   
-   bps = 30
-   dt = float(1)/float(bps)
-   
-   @staticmethod   
-   def send(addr, bw, dt):
-
-      # Bandwidth and time interval must be integers.
-      bw = int(bw)
-      dt = int(dt)
-
-      # The minimum bandwidth is UDPClient.bps*UDPPacket.payload_size kbps,
-      # with a maximum precision of UDPPacket.payload_size kbps.
-      N = max(UDPClient.bps, bw / (UDPPacket.payload_size/125))
-      Nratio = N / UDPClient.bps
-      Nmod = N % UDPClient.bps
-
-      try:
-         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-         timestamp = 0
-         for t in range(dt):
-            for i in range(UDPClient.bps):
-               t_i = time.time()
-               if i < Nmod: M = Nratio + 1
-               else: M = Nratio
-               for j in range(M):
-                  s.sendto(UDPPacket.encode(timestamp), (addr, UDPServer.port))
-                  timestamp += 1
-               t_e = time.time()
-               time.sleep(max(0, UDPClient.dt - (t_e - t_i)));
-
-      except socket.error, msg:
-         print 'Unable to send the UDP stream:', msg
-         timestamp = -1
-      finally:
-         s.close()
+""" 
+Author: Cedric Bonhomme
+Date: 19-07-2015
+
+This file contains the implementation of the UDP module, used in senders 
+(UDPClient) and listeners (UDPServer).
+UDPClients send UDPPackets to UDPServers at a given rate, while those 
+servers keep tracks on various statistics about their incoming streams.
+"""
+
+import time
+import errno
+import fcntl
+import socket
+import struct
+import multiprocessing
+from threading import Thread, Lock
+from pacer import Pacer
+from arrivals import ArrivalTrace
+
+# Python 2 does not define SO_REUSEPORT (15 on Linux).
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)
+
+# Kernel reception timestamps: SIOCGSTAMPNS returns the arrival time of the 
+# last datagram received by a socket, as a timespec.
+SIOCGSTAMPNS = 0x8907
+timespec = struct.Struct('@ll')
+
+###############################################################################
+class UDPPacket:
+
+   """
+   UDPPacket is the data structure representing UDP packets. The payload size 
+   is fixed to 1250 bytes (10kb) to ease the measurement. The separation 
+   between header and payload allows to measure the goodput only. Each packet 
+   has a timestamp, in order to track losses, and the identifier of its flow. 
+   It contains only two static methods: encode and decode.
+   """
+
+   payload_size = 1250
+   header_size = 12 # Minimum RTP header size.
+   tot_size = header_size + payload_size
+
+   # The timestamp is packed in the first 8 bytes of the header, the flow 
+   # identifier in the last 2 bytes.
+   header = struct.Struct('!Q2xH')
+   payload = 'b' * payload_size
+   
+   @staticmethod
+   def decode(data):
+      return UDPPacket.header.unpack_from(data)
+
+   @staticmethod
+   def encode(timestamp, flow = 0):
+      return UDPPacket.header.pack(timestamp, flow) + UDPPacket.payload
+      
+###############################################################################
+class UDPBurst:
+
+   """
+   UDPBurst is a preallocated buffer holding the packets of a burst. Payloads 
+   are written once: before each burst, only the timestamps are patched in 
+   place and the packets are flushed from views on the buffer, so that no 
+   packet is built while streaming.
+   """
+
+   def __init__(self, n, flow = 0):
+      self.n = n
+      self.flow = flow
+      self.buf = bytearray(UDPPacket.encode(0, flow) * n)
+      view = memoryview(self.buf)
+      self.packets = [view[i*UDPPacket.tot_size:(i+1)*UDPPacket.tot_size] 
+                      for i in range(n)]
+
+   # Sends M packets with consecutive timestamps and returns the next one.
+   def flush(self, s, addr, timestamp, M):
+      pack_into = UDPPacket.header.pack_into
+      sendto = s.sendto
+      for i in range(M):
+         pack_into(self.buf, i*UDPPacket.tot_size, timestamp + i, self.flow)
+      for p in self.packets[:M]:
+         sendto(p, addr)
+      return timestamp + M
+
+###############################################################################
+class UDPWindow:
+
+   """
+   UDPWindow keeps track of the sequence numbers received by a flow, in a 
+   sliding window covering the last 'size' numbers. Each arrival, either in 
+   order, late or duplicated, is handled in constant (amortized) time. Packets 
+   still missing when they leave the window are considered lost for good.
+   """
+
+   size = 1 << 16
+
+   def __init__(self):
+      self.seen = bytearray(UDPWindow.size) # Reception flags, seq % size.
+      self.seen[0] = 1
+      self.current = 0 # Highest sequence number received.
+      self.received = 1 # Number of sequence numbers received.
+      self.first = 1 # Lowest sequence number not received yet.
+      self.settled = False # True if the first missing packet left the window.
+
+   # Records the arrival of sequence number n. Returns the number of packets 
+   # found missing because of this arrival, or -1 if a missing packet arrived.
+   def add(self, n):
+      W = UDPWindow.size
+
+      # The incoming packet is not delayed, but prior packets may be missing.
+      if n > self.current:
+         # Flags of the numbers leaving the window are overwritten: the first 
+         # missing number is then known for good.
+         self.advance()
+         if self.first <= n - W:
+            self.settled = True
+
+         # Clearing the flags of the numbers entering the window.
+         c = min(n - self.current, W)
+         i = (self.current + 1) % W
+         if i + c <= W:
+            self.seen[i:i + c] = bytearray(c)
+         else:
+            self.seen[i:] = bytearray(W - i)
+            self.seen[:i + c - W] = bytearray(i + c - W)
+
+         missing = n - self.current - 1
+         self.current = n
+         self.seen[n % W] = 1
+         self.received += 1
+         self.advance()
+         return missing
+
+      # The incoming packet is delayed, or duplicated, or out of the window.
+      if n <= self.current - W or self.seen[n % W]:
+         return 0
+      self.seen[n % W] = 1
+      self.received += 1
+      self.advance()
+      return -1
+
+   # Moves the first missing number forward, past the received ones.
+   def advance(self):
+      while not self.settled and self.first <= self.current and \
+            self.seen[self.first % UDPWindow.size]:
+         self.first += 1
+
+   # Returns the number of packets missing so far.
+   def missing(self):
+      return self.current + 1 - self.received
+
+   # Returns the lowest missing sequence number, -1 if none is missing.
+   def first_missing(self):
+      if self.first <= self.current:
+         return self.first
+      return -1
+
+   # Adds the numbers received by another window of the same flow (from 
+   # another worker). The numbers which left a window are lost, hence the 
+   # merge is only exact if one of the windows received nothing, or if no 
+   # number left either of them: a flow must be received by a single worker 
+   # (see UDPWorkers). The window which received the most numbers is kept, 
+   # and the other one is replayed into it.
+   def merge(self, w):
+      assert min(self.current, w.current) == 0 or \
+             max(self.current, w.current) < UDPWindow.size, \
+             'a flow must be received by a single worker'
+      if w.received > self.received:
+         state = self.__dict__.copy()
+         self.__dict__.update(w.__dict__)
+         w = UDPWindow()
+         w.__dict__.update(state)
+
+      for n in xrange(1, w.current + 1):
+         if w.seen[n % UDPWindow.size]:
+            self.add(n)
+
+###############################################################################
+class UDPFlow:
+
+   """
+   UDPFlow is a data structure used by UDPServers to keep tracks of incoming 
+   UDP streams and to compute statistics about them.   
+   """
+   
+   # Lengths of the intervals of the arrival curve (s), from 1 ms to 1 s.
+   taus = [0.001 * 2**k for k in range(11)]
+
+   # A stream is identified by its source and a flow identifier. The clock 
+   # tells where its arrival times come from.
+   def __init__(self, src, bw, flow = 0, clock = 'user'):
+      self.src = src
+      self.flow = flow
+      self.clock = clock
+      self.bw = bw
+      self.window = UDPWindow() # Missing (delayed or lost) packets.
+      self.trace = ArrivalTrace() # Arrived packets.
+
+      # Based on the bandwidth, the number of packets per second can be computed. 
+      self.M = max(UDPClient.bps, self.bw / (UDPPacket.payload_size/125))
+      self.Mratio = self.M / UDPClient.bps
+      self.Mmod = self.M % UDPClient.bps
+
+   def add(self, timestamp, t):
+      self.trace.add(timestamp, t, UDPPacket.payload_size)
+
+      # Delayed and missing packets are tracked by the window.
+      self.window.add(timestamp)
+
+   # Merges the statistics of the same flow, received by another UDPServer. 
+   # Returns the resulting flow.
+   def merge(self, f):
+      self.trace.merge(f.trace)
+      self.window.merge(f.window)
+      return self
+
+   # Returns the (rho, sigma) parameters based on the stream's statistics, 
+   # together with the clock of the arrival times, the smallest sigma of a 
+   # token bucket of rate rho containing all the arrivals, and the arrival 
+   # curve of the stream over UDPFlow.taus.
+   def log(self):
+      # rho = db/dt, over the whole trace.
+      rho = self.trace.rate()
+      
+      # sigma = db*dt, with dt the sending time of the first missing packet.
+      t = self.window.first_missing()
+      if t != -1:
+         sigma = (self.bw - rho) * self.compute_dt(t)
+      # No loss: undefined.
+      else:
+         sigma = -1
+
+      # Values are rounded to integers.
+      curve = [int(b) for b in self.trace.arrival_curve(UDPFlow.taus)]
+      return int(rho), int(sigma), self.clock, int(self.trace.envelope(rho)), curve
+      
+   # Compute the relative sending time based on the timestamp and the bandwidth.
+   def compute_dt(self, t):
+      dt = t / self.M
+      t -= dt*self.M
+
+      if t < self.Mmod*(self.Mratio+1):
+         dt += (t /(self.Mratio+1))*UDPClient.dt
+      else:
+         dt += self.Mmod*UDPClient.dt
+         t -= self.Mmod*(self.Mratio+1)
+         dt += (t/self.Mratio)*UDPClient.dt
+      return dt   
+
+###############################################################################
+class UDPServer(Thread):
+
+   """
+   UDPServer is a thread handling incoming UDPPackets. If packets belong to an 
+   existing flow, they are added to it, or discarded otherwise. Flows are 
+   indexed by (source, flow identifier), hence several flows can come from the 
+   same source.
+   """
+   
+   port = 6000
+
+   # Source of the arrival times: 'kernel' (reception timestamps, if supported 
+   # by the system) or 'user' (time at which recvfrom returns).
+   clock = 'kernel'
+   expiration = 3
+   
+   # Several servers (in different processes) can share the port if reuse.
+   def __init__(self, addr, reuse = False):
+      Thread.__init__(self)
+      self.reactor = None
+      try:
+         self.ON = True
+         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+         if reuse:
+            self.s.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+         self.s.bind((addr, UDPServer.port))
+         self.s.settimeout(UDPServer.expiration)
+         self.flowHandler = {}
+         self.lock = Lock() # Flows are not removed while a packet is added.
+         self.clock = UDPServer.clock
+         if self.clock == 'kernel':
+            self.clock = self.timestamps()
+      except socket.error, msg:
+         print 'Socket creation error:', msg
+         self.ON = False      
+      
+   def close(self):
+      self.ON = False
+      if self.reactor is not None:
+         self.reactor.remove(self.s)
+      self.s.close()
+
+   def isAlive(self):
+      return self.ON
+
+   # Enables the kernel reception timestamps of the socket: the first request 
+   # turns them on. Returns the clock used, 'user' if they are not supported.
+   def timestamps(self):
+      try:
+         fcntl.ioctl(self.s.fileno(), SIOCGSTAMPNS, timespec.pack(0, 0))
+      except IOError, e:
+         # No datagram has been stamped yet.
+         if e.errno != errno.ENOENT:
+            return 'user'
+      return 'kernel'
+
+   # Receives a datagram and returns it with its arrival time.
+   def recv(self):
+      data, addr = self.s.recvfrom(UDPPacket.tot_size) # Blocking operation.
+      if self.clock == 'kernel':
+         try:
+            sec, nsec = timespec.unpack(fcntl.ioctl(self.s.fileno(), SIOCGSTAMPNS, timespec.pack(0, 0)))
+            return data, addr, sec + nsec*1e-9
+         except IOError:
+            pass
+      return data, addr, time.time()
+
+   # Finds a flow based on an IP address and a flow identifier.
+   def find(self, src, flow = 0):
+      return self.flowHandler.get((src, flow))
+
+   # Adds a flow to the flow handler.
+   def addFlow(self, src, bw, flow = 0):
+      self.flowHandler[(src, flow)] = UDPFlow(src, bw, flow, self.clock)
+
+   # Removes a flow from the flow handler and returns it (None if there is 
+   # none). Once removed, the flow is not modified anymore.
+   def remove(self, src, flow = 0):
+      with self.lock:
+         return self.flowHandler.pop((src, flow), None)
+
+   # Removes a flow from the flow handler and returns its statistics, which 
+   # are also handed to callback if given.
+   def delFlow(self, src, flow = 0, callback = None):
+      f = self.remove(src, flow)
+      log = '' if f is None else f.log()
+      if callback is not None:
+         callback(log)
+      return log
+
+   # Handles an incoming packet: it is added to its flow, if any.
+   def handle(self):
+      d = self.recv()
+      if len(d[0]) < UDPPacket.header_size:
+         return
+      timestamp, flow = UDPPacket.decode(d[0])
+      with self.lock:
+         f = self.flowHandler.get((d[1][0], flow))
+         if f is not None:
+            f.add(timestamp, d[2])
+
+   # Infinite loop handling incoming packets.
+   def run(self):
+      while self.ON:
+         try:
+            self.handle()
+         # The timeout allows for closing the server properly.
+         except socket.timeout:
+            continue
+         except socket.error, msg:
+            print 'Socket error:', msg
+            self.ON = False 
+
+   # Runs the server in the given reactor instead of its own thread.
+   def attach(self, reactor):
+      self.reactor = reactor
+      self.s.setblocking(0)
+      reactor.add(self.s, self.ready)
+
+   # Handles the packets waiting in the socket (reactor).
+   def ready(self):
+      try:
+         while self.ON:
+            self.handle()
+      except socket.error, msg:
+         if msg.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+            return
+         print 'Socket error:', msg
+         self.ON = False
+         self.reactor.stop()
+
+###############################################################################
+class UDPWorkers:
+
+   """
+   UDPWorkers spreads the reception of UDPPackets over several processes, each 
+   one running a UDPServer bound to the same port with SO_REUSEPORT. The 
+   kernel shards incoming datagrams by source (address and port), so that 
+   each flow, sent from a single socket, is received by a single worker, which 
+   keeps its statistics locally (see UDPWindow.merge). Flows are created 
+   in every worker, and their statistics are merged when they are removed. It 
+   offers the same interface as a UDPServer. If attached to a reactor, the 
+   pipes of the workers are read by the reactor, so that removing a flow 
+   never waits for the workers.
+   """
+
+   def __init__(self, addr, n):
+      self.ON = True
+      self.addr = addr
+      self.n = n
+      self.workers = [] # List of (process, pipe).
+      self.reactor = None
+
+      # Flows removed, waiting for the answers of the workers (reactor): 
+      # [answers left, merged flow, callback], by (source, flow identifier).
+      self.pending = {}
+
+   def start(self):
+      for i in range(self.n):
+         pipe, child = multiprocessing.Pipe()
+         p = multiprocessing.Process(target = UDPWorkers.work, args = (self.addr, child))
+         p.daemon = True
+         p.start()
+         self.workers.append((p, pipe))
+
+      # Each worker acknowledges the creation of its server.
+      for p, pipe in self.workers:
+         self.ON = self.ON and pipe.recv()
+
+   def close(self):
+      self.ON = False
+      for p, pipe in self.workers:
+         if self.reactor is not None:
+            self.reactor.remove(pipe)
+         try:
+            pipe.send(('close',))
+         except (IOError, EOFError):
+            pass
+
+   def join(self):
+      for p, pipe in self.workers:
+         p.join()
+
+   def isAlive(self):
+      return self.ON and all(p.is_alive() for p, pipe in self.workers)
+
+   # Adds a flow to every worker.
+   def addFlow(self, src, bw, flow = 0):
+      for p, pipe in self.workers:
+         pipe.send(('add', src, bw, flow))
+
+   # Removes a flow from every worker and returns the statistics of the 
+   # merge, which are also handed to callback if given. If attached, nothing 
+   # is returned: the statistics are handed to callback once every worker 
+   # answered (see ready).
+   def delFlow(self, src, flow = 0, callback = None):
+      for p, pipe in self.workers:
+         pipe.send(('del', src, flow))
+      if self.reactor is not None:
+         self.pending[(src, flow)] = [len(self.workers), None, callback]
+         return
+
+      f = None
+      for p, pipe in self.workers:
+         f = UDPWorkers.merge(f, pipe.recv()[2])
+      log = '' if f is None else f.log()
+      if callback is not None:
+         callback(log)
+      return log
+
+   # Returns the merge of two flows, either of which may be None.
+   @staticmethod
+   def merge(f, g):
+      if f is None:
+         return g
+      if g is None:
+         return f
+      return f.merge(g)
+
+   # Starts the workers, whose pipes are then read by the given reactor.
+   def attach(self, reactor):
+      self.start()
+      self.reactor = reactor
+      for p, pipe in self.workers:
+         reactor.add(pipe, lambda pipe = pipe: self.ready(pipe))
+
+   # Reads the answer of a worker (reactor). The statistics of a flow are 
+   # handed to its callback once every worker answered.
+   def ready(self, pipe):
+      try:
+         src, flow, f = pipe.recv()
+      except (IOError, EOFError):
+         # The worker is dead: the reactor is stopped.
+         self.ON = False
+         self.reactor.remove(pipe)
+         self.reactor.stop()
+         return
+
+      pending = self.pending[(src, flow)]
+      pending[0] -= 1
+      pending[1] = UDPWorkers.merge(pending[1], f)
+      if pending[0] == 0:
+         del self.pending[(src, flow)]
+         pending[2]('' if pending[1] is None else pending[1].log())
+
+   # Main loop of a worker process, handling the commands of the pipe.
+   @staticmethod
+   def work(addr, pipe):
+      server = UDPServer(addr, True)
+      pipe.send(server.isAlive())
+      if not server.isAlive():
+         return
+
+      server.start()
+      try:
+         while server.isAlive():
+            if not pipe.poll(UDPServer.expiration):
+               continue
+            cmd = pipe.recv()
+            if cmd[0] == 'add':
+               server.addFlow(*cmd[1:])
+            elif cmd[0] == 'del':
+               # The flow is removed before being sent (pickled).
+               pipe.send((cmd[1], cmd[2], server.remove(cmd[1], cmd[2])))
+            else:
+               break
+      except (IOError, EOFError):
+         pass
+      finally:
+         server.close()
+         server.join()
+
+###############################################################################
+class UDPClient:
+
+   """
+   UDPClient is the class streaming UDPPackets at a given rate, towards a 
+   single UDPServer. It contains a single static method.
+   """
+
+   # Bursts per second: packets are sent at discrete, finite times. Setting 
+   # a frequency similar to those in video streaming gives a measure that is 
+   # close to the real behaviour of its target application.   
+   bps = 30
+   dt = float(1)/float(bps)
+   
+   @staticmethod   
+   def send(addr, bw, dt, flow = 0):
+
+      # Bandwidth and time interval must be integers.
+      bw = int(bw)
+      dt = int(dt)
+
+      # The minimum bandwidth is UDPClient.bps*UDPPacket.payload_size kbps,
+      # with a maximum precision of UDPPacket.payload_size kbps.
+      N = max(UDPClient.bps, bw / (UDPPacket.payload_size/125))
+      Nratio = N / UDPClient.bps
+      Nmod = N % UDPClient.bps
+
+      # Packets of a burst are built once and reused.
+      burst = UDPBurst(Nratio + 1, flow)
+      dest = (addr, UDPServer.port)
+
+      try:
+         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+         # Bursts are released on absolute deadlines.
+         pacer = Pacer(UDPClient.dt)
+         timestamp = 0
+         for t in range(dt):
+            for i in range(UDPClient.bps):
+               if i < Nmod: M = Nratio + 1
+               else: M = Nratio
+               pacer.wait()
+               timestamp = burst.flush(s, dest, timestamp, M)
+
+         # The rate is not reached if bursts are released late.
+         n, late, mean, worst = pacer.stats()
+         if late:
+            print 'Warning:', late, 'of', n, 'bursts could not keep up with', bw, 'kbps',
+            print '(lateness: mean %.3f ms, max %.3f ms)' % (1000*mean, 1000*worst)
+
+      except socket.error, msg:
+         print 'Unable to send the UDP stream:', msg
+         timestamp = -1
+      finally:
+         s.close()
          return timestamp
\ No newline at end of file